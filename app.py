@@ -1,17 +1,27 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
+from typing import Dict
 from typing_extensions import Annotated
 
 from routers import *
-from db import models, crud, get_sync_db, get_async_db, sync_engine
+from db import models, crud, get_async_db, get_pool_stats, create_schema, async_engine
 from lib.utils import UserAuthDep
 
 load_dotenv()
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create missing tables once here instead of on every request
+    await create_schema()
+    yield
+    await async_engine.dispose()
+
+
 def start_app():
-    app = FastAPI(swagger_ui_parameters={"syntaxHighlight": False})
+    app = FastAPI(swagger_ui_parameters={"syntaxHighlight": False}, lifespan=lifespan)
     app.include_router(router=user_router)
     app.include_router(router=sub_router)
     # settings = get_settings()
@@ -20,7 +30,6 @@ def start_app():
     app.add_middleware(
         CORSMiddleware, allow_origins=origins, allow_methods=["*"], allow_headers=["*"]
     )
-    models.Base.metadata.create_all(bind=sync_engine)
     return app
 
 
@@ -33,6 +42,16 @@ async def health(request: Request, user_id: UserAuthDep) -> str:
     return "Price Sentry is up and running."
 
 
+@app.get("/health/pool")
+async def pool_health(user_id: UserAuthDep) -> Dict[str, Dict[str, float]]:
+    """
+    Live statistics of the database connection pools of this API process, to size
+    `DB_POOL_SIZE` and `DB_MAX_OVERFLOW` from data. `checked_out` and `overflow` are
+    the current state, the other counters add up since the process started.
+    """
+    return get_pool_stats()
+
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
 AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
@@ -2,7 +2,7 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 import time
 import requests
-from typing import Optional
+from typing import Dict, Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -12,11 +12,87 @@ class Settings(BaseSettings):
     db_user: str
     db_passwd: str
     db_name: str
+    # connection pool of each engine (sync and async), per process
+    db_pool_size: int = 5
+    db_max_overflow: int = 5
+    # seconds to wait for a free connection before giving up
+    db_pool_timeout: float = 30
+    # replace connections older than this, below MySQL's wait_timeout
+    db_pool_recycle: int = 3600
+    # test connections on checkout and transparently replace dead ones
+    db_pool_pre_ping: bool = True
     # jwt secret
     secret: str
     # email
     email_from: str
     app_password: str
+    smtp_host: str = "smtp.gmail.com"
+    smtp_port: int = 587
+    smtp_starttls: bool = True
+    smtp_pool_size: int = 2
+    smtp_max_messages_per_connection: int = 100
+    # products a user can subscribe to with one bulk request
+    subscribe_max_products: int = 500
+    # scraper driver pool
+    driver_pool_size: int = 2
+    driver_max_pages: int = 50
+    driver_checkout_timeout: float = 60
+    driver_max_idle_seconds: float = 300
+    driver_headless: bool = True
+    # scraper fetching, "http" tries a plain GET before falling back to the browser
+    scraper_fetch_mode: Literal["http", "browser"] = "http"
+    scraper_http_timeout: float = 10
+    # "process" parses pages in a pool of worker processes, one per core by default
+    scraper_parse_mode: Literal["inline", "process"] = "inline"
+    scraper_parse_processes: Optional[int] = None
+    # number of product pages fetched concurrently by a search
+    search_workers: int = 4
+    # re-check the include words against the title on the product page
+    search_confirm_include: bool = True
+    # search result cache, "db" shares entries between API workers
+    search_cache_size: int = 256
+    search_cache_ttl: float = 900
+    search_cache_backend: Literal["memory", "db"] = "memory"
+    # debug snapshots of scraped pages, disabled unless a directory is set
+    scraper_snapshot_dir: Optional[str] = None
+    scraper_snapshot_retention: int = 200
+    # price monitor sweep, concurrency of each pipeline stage
+    monitor_fetch_concurrency: int = 4
+    monitor_persist_concurrency: int = 2
+    monitor_queue_size: int = 100
+    # changed prices are written in one transaction per chunk
+    monitor_persist_chunk_size: int = 500
+    monitor_persist_batch_timeout: float = 1.0
+    # adaptive check scheduling, intervals in seconds
+    monitor_base_interval: float = 3600
+    monitor_min_interval: float = 900
+    monitor_max_interval: float = 86400
+    monitor_refresh_interval: float = 600
+    # products are loaded this many at a time, each chunk in its own session
+    monitor_load_chunk_size: int = 1000
+    monitor_max_batch: int = 200
+    # max checks per hour for each vendor
+    monitor_vendor_budgets: Dict[str, float] = {"amazon": 3600}
+    # worker mode, leases not renewed within this many seconds are taken over
+    monitor_lease_seconds: float = 120
+    # price history, every checked price is kept raw for a while and rolled up
+    # into hourly and daily min/max/last, hourly rollups are dropped later
+    history_batch_size: int = 500
+    history_batch_timeout: float = 1.0
+    history_raw_retention_days: int = 7
+    history_hourly_retention_days: int = 90
+    history_prune_interval: float = 86400
+    # notification dispatcher, draining the outbox written by the monitor
+    dispatcher_batch_size: int = 100
+    dispatcher_concurrency: int = 4
+    dispatcher_poll_interval: float = 5
+    # claimed rows not reported back within this many seconds are sent again
+    dispatcher_lease_seconds: float = 300
+    dispatcher_max_attempts: int = 5
+    # delay before the first retry, doubled after every failed attempt
+    dispatcher_retry_delay: float = 60
+    # drops of users in digest mode are collected this many seconds into one email
+    dispatcher_digest_window: float = 3600
 
     model_config = SettingsConfigDict(env_file=".env")
 
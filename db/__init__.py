@@ -1 +1,9 @@
-from .base import get_sync_db, get_async_db, sync_engine
+from .base import (
+    get_sync_db,
+    get_async_db,
+    get_pool_stats,
+    create_schema,
+    create_schema_sync,
+    sync_engine,
+    async_engine,
+)
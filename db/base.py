@@ -1,24 +1,42 @@
+from typing import Dict
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from config import get_settings
+from db.pool import PoolStats, timed_pool_class
 
 
 settings = get_settings()
 SQLALCHEMY_DATABASE_URL_SYNC = f"mysql://{settings.db_user}:{settings.db_passwd}@{settings.db_host}/{settings.db_name}"
 SQLALCHEMY_DATABASE_URL_ASYNC = f"mysql+aiomysql://{settings.db_user}:{settings.db_passwd}@{settings.db_host}/{settings.db_name}"
 
+POOL_OPTIONS = dict(
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+)
+
+sync_pool_stats = PoolStats(name="sync")
 sync_engine = create_engine(
     SQLALCHEMY_DATABASE_URL_SYNC,
-    max_overflow=5,
+    poolclass=timed_pool_class(QueuePool, sync_pool_stats),
+    **POOL_OPTIONS,
 )
+sync_pool_stats.attach(sync_engine)
 
+async_pool_stats = PoolStats(name="async")
 async_engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL_ASYNC,
-    max_overflow=5,
+    poolclass=timed_pool_class(AsyncAdaptedQueuePool, async_pool_stats),
+    **POOL_OPTIONS,
 )
+async_pool_stats.attach(async_engine.sync_engine)
 
 SyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
 
@@ -29,6 +47,16 @@ AsyncSessionLocal = async_sessionmaker(
 Base = declarative_base()
 
 
+def get_pool_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Live statistics of the connection pools of both engines.
+    """
+    return {
+        "sync": sync_pool_stats.snapshot(sync_engine.pool),
+        "async": async_pool_stats.snapshot(async_engine.pool),
+    }
+
+
 def get_sync_db():
     db = SyncSessionLocal()
     try:
@@ -37,10 +65,30 @@ def get_sync_db():
         db.close()
 
 
-async def get_async_db():
-    async with async_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+async def create_schema() -> None:
+    """
+    Bring the schema up to date with the migrations in `db.migrations`. Called once
+    when the API starts.
+    """
+    from db import migrations
 
+    async with async_engine.connect() as conn:
+        await conn.run_sync(migrations.upgrade)
+
+
+def create_schema_sync() -> None:
+    """
+    `create_schema` for the price monitor and the notification dispatcher, which
+    can start before the API has migrated the database.
+    """
+    from db import migrations
+
+    with sync_engine.connect() as conn:
+        migrations.upgrade(conn)
+
+
+async def get_async_db():
+    # Only checks out a connection, the schema is created once at startup
     db = AsyncSessionLocal()
     try:
         yield db
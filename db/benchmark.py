@@ -0,0 +1,77 @@
+"""
+Count the database round trips and time of the session dependency per request.
+
+Runs what an authenticated request does with the database, a session from the
+dependency and the user lookup of `get_user_id`, against the configured database:
+
+    python -m db.benchmark --requests 200
+
+and compares the current dependency with the one that ran `create_all` first.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import AsyncIterator, Callable, Tuple
+
+from sqlalchemy import event
+
+from db import crud
+from db.base import Base, AsyncSessionLocal, async_engine, create_schema, get_async_db
+
+
+async def create_all_per_request_db() -> AsyncIterator:
+    """
+    The session dependency as it was, creating the schema on every call.
+    """
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    db = AsyncSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def run(dependency: Callable, requests: int) -> Tuple[float, float]:
+    """
+    Return the average round trips and milliseconds per request.
+    """
+    round_trips = [0]
+
+    def count(*args) -> None:
+        round_trips[0] += 1
+
+    sync_engine = async_engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", count)
+    event.listen(sync_engine, "commit", count)
+    try:
+        start = time.perf_counter()
+        for _ in range(requests):
+            async for db in dependency():
+                await crud.get_user_by_id(db=db, user_id="benchmark")
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", count)
+        event.remove(sync_engine, "commit", count)
+    return round_trips[0] / requests, elapsed / requests * 1000
+
+
+async def main(requests: int) -> None:
+    await create_schema()
+    for name, dependency in [
+        ("create_all per request", create_all_per_request_db),
+        ("schema at startup", get_async_db),
+    ]:
+        await run(dependency, requests=5)  # Fill the connection pool
+        round_trips, ms = await run(dependency, requests=requests)
+        print(f"{name:>24}: {round_trips:5.1f} round trips, {ms:6.2f} ms per request")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(requests=args.requests))
@@ -1,13 +1,20 @@
 # from sqlalchemy.orm import Session
-from typing import List, Optional, Union
+import datetime
+import numpy as np
+from typing import Dict, List, Optional, Set, Tuple, Union
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
-from sqlalchemy.orm import Session
+from sqlalchemy import Table, case, delete, func, insert, or_, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.sql.expression import Insert
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session, aliased
 
 
 from lib import schemas
+from lib.alerts import PriceDrop, should_alert
 from db import models
-from lib.utils import get_logger
+from lib.logger import get_logger
 
 
 # logger = logging.getLogger(name=__name__)
@@ -73,6 +80,22 @@ async def update_user(db: AsyncSession, user_id: str, first_name: str, last_name
         return
 
 
+async def update_alert_mode(
+    db: AsyncSession, user_id: str, alert_mode: schemas.AlertMode
+):
+    try:
+        logger.info(f"Updating alert mode of user_id {user_id} to {alert_mode}")
+        await db.execute(
+            update(models.User)
+            .where(models.User.id == user_id)
+            .values(alert_mode=alert_mode)
+        )
+        await db.commit()
+    except Exception as err:
+        logger.error(f"Failed to update alert mode of user_id {user_id}. {err}")
+        raise
+
+
 async def delete_user(
     db: AsyncSession, user_id: str
 ) -> Union[schemas.SuccessResp, schemas.FailureResp]:
@@ -95,97 +118,787 @@ async def delete_user(
         )
 
 
-async def get_product_by_id(
-    db: AsyncSession, link_id: str
-) -> Optional[List[schemas.Product]]:
+async def get_subscribed_products(
+    db: AsyncSession, user_id: str, limit: int, after: Optional[str] = None
+) -> List[models.Product]:
+    """
+    One page of the products `user_id` subscribes to, ordered by link id, with one
+    join query. Pass the last link id of the previous page as `after` to get the
+    next one. The page is read from the (user_id, link_id) primary key of the
+    subscriptions, so its cost does not grow with the number of subscriptions.
+    """
     try:
-        logger.info(f"Getting product by link id: {link_id}")
+        logger.info(f"Getting {limit} products of user id {user_id} after {after}")
+        query = (
+            select(models.Product)
+            .join(
+                models.Subscription,
+                models.Subscription.link_id == models.Product.link_id,
+            )
+            .where(models.Subscription.user_id == user_id)
+        )
+        if after is not None:
+            query = query.where(models.Subscription.link_id > after)
         res = await db.execute(
-            select(models.Product).where(models.Product.link_id == link_id)
+            query.order_by(models.Subscription.link_id).limit(limit)
         )
-        product = res.scalar()
-        return product
+        return list(res.scalars().all())
     except Exception as err:
-        logger.error(f"Failed to get product by link id: {link_id}. {err}")
-        return
-
-
-async def create_product(db: AsyncSession, product: schemas.Product):
+        logger.error(f"Failed to get products of user id {user_id}. {err}")
+        return []
+
+
+def _insert_skipping_existing(table: Table, dialect: str, key: str) -> Insert:
+    """
+    INSERT into `table` that skips rows whose `key` already exists. Unlike INSERT
+    IGNORE, errors such as too long values or NULL in a NOT NULL column still fail
+    the statement instead of being downgraded to warnings.
+    """
+    if dialect == "mysql":
+        stmt = mysql_insert(table)
+        # A no-op update of the existing row
+        return stmt.on_duplicate_key_update({key: table.c[key]})
+    if dialect == "sqlite":
+        return sqlite_insert(table).on_conflict_do_nothing()
+    return insert(table)
+
+
+async def subscribe_products(
+    db: AsyncSession, user_id: str, products: List[schemas.Product]
+) -> Optional[int]:
+    """
+    Subscribe `user_id` to `products` in one transaction.
+
+    Products that are not in the product table yet are created first, existing ones
+    are left as they are. The inserts skip rows whose key already exists instead of
+    looking each of them up, so a list of any length takes three statements. Returns
+    the number of new subscriptions, not counting the products the user already
+    subscribed to, or None when the transaction was rolled back.
+    """
+    # The same product twice in one list is one subscription
+    products = list({product.link_id: product for product in products}.values())
+    if not products:
+        return 0
+    dialect = db.bind.dialect.name
     try:
-        logger.info(
-            f"Creating product with title {product.title}, vendor of {schemas.Vendor(product.vendor)}, link {product.link}, link id {product.link_id}, img src {product.img_src}, price {product.price}"
+        logger.info(f"Subscribing user id {user_id} to {len(products)} products")
+        await db.execute(
+            _insert_skipping_existing(models.Product.__table__, dialect, "link_id"),
+            [
+                {
+                    "title": product.title,
+                    "vendor": product.vendor,
+                    "link": product.link,
+                    "link_id": product.link_id,
+                    "img_src": product.img_src,
+                    "price": product.price,
+                }
+                for product in products
+            ],
         )
-        product_to_create = models.Product(
-            title=product.title,
-            vendor=product.vendor,
-            link=product.link,
-            link_id=product.link_id,
-            img_src=product.img_src,
-            price=product.price,
+        res = await db.execute(
+            select(models.Subscription.link_id).where(
+                models.Subscription.user_id == user_id,
+                models.Subscription.link_id.in_([p.link_id for p in products]),
+            )
         )
-        db.add(product_to_create)
+        subscribed = set(res.scalars().all())
+        new_link_ids = [p.link_id for p in products if p.link_id not in subscribed]
+        if new_link_ids:
+            # Still skips existing rows, in case the same user subscribes twice at once
+            await db.execute(
+                _insert_skipping_existing(
+                    models.Subscription.__table__, dialect, "link_id"
+                ),
+                [{"user_id": user_id, "link_id": link_id} for link_id in new_link_ids],
+            )
         await db.commit()
+        logger.info(
+            f"Successfully subscribed user id {user_id} to {len(new_link_ids)} new products"
+        )
+        return len(new_link_ids)
     except Exception as err:
+        await db.rollback()
         logger.error(
-            f"Failed to create product with title {product.title}, vendor of {schemas.Vendor(product.vendor)}, link {product.link}, link id {product.link_id}, img src {product.img_src}, price {product.price}. {err}"
+            f"Failed to subscribe user id {user_id} to {len(products)} products. {err}"
         )
+        return None
 
 
-def update_product_price(db: Session, link_id: str, new_price: float):
-    pass
-
-
-async def get_subscription(
-    db: AsyncSession, user_id: str, link_id: str
-) -> Optional[schemas.Subscription]:
+def update_product_prices(
+    db: Session,
+    prices: Dict[str, float],
+    chunk_size: int = 500,
+    drops: Optional[Dict[str, PriceDrop]] = None,
+) -> Set[str]:
+    """
+    Write many new product prices at once.
+
+    The prices are applied in chunks of `chunk_size`, each chunk with one CASE based
+    UPDATE in its own transaction. A failing chunk is rolled back and logged without
+    affecting the others. Returns the link ids whose price was written, which
+    excludes link ids that are not in the product table.
+
+    `drops` maps the link ids whose new price is a drop to the drop. Subscribers of
+    these products whose thresholds the drop meets get a row in the notification
+    outbox, written in the same transaction as the price, so a drop is never lost
+    between the two.
+    """
+    drops = drops or {}
+    updated = set()
+    link_ids = list(prices)
+    for i in range(0, len(link_ids), chunk_size):
+        chunk = link_ids[i : i + chunk_size]
+        try:
+            logger.info(f"Updating the price of {len(chunk)} products")
+            res = db.execute(
+                select(models.Product.link_id).where(models.Product.link_id.in_(chunk))
+            )
+            existing = set(res.scalars().all())
+            for link_id in set(chunk) - existing:
+                logger.error(f"Product with link id {link_id} not found")
+            if existing:
+                db.execute(
+                    update(models.Product)
+                    .where(models.Product.link_id.in_(existing))
+                    .values(
+                        price=case(
+                            {link_id: prices[link_id] for link_id in existing},
+                            value=models.Product.link_id,
+                        )
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            dropped = [link_id for link_id in existing if link_id in drops]
+            if dropped:
+                enqueue_notifications(
+                    db=db,
+                    drops={link_id: drops[link_id] for link_id in dropped},
+                    prices={link_id: prices[link_id] for link_id in dropped},
+                )
+            db.commit()
+            updated |= existing
+        except Exception as err:
+            db.rollback()
+            logger.error(f"Failed to update the price of {len(chunk)} products. {err}")
+    return updated
+
+
+def enqueue_notifications(
+    db: Session, drops: Dict[str, PriceDrop], prices: Dict[str, float]
+) -> int:
+    """
+    Add an outbox row for every subscriber of the dropped products whose alert
+    thresholds the new price meets. Returns the number of rows. Does not commit.
+
+    The thresholds of all subscriptions of the products are loaded into arrays and
+    checked with one vectorized comparison instead of one by one.
+    """
+    res = db.execute(
+        select(
+            models.Subscription.link_id,
+            models.Subscription.user_id,
+            models.Subscription.target_price,
+            models.Subscription.min_drop_percent,
+        ).where(models.Subscription.link_id.in_(drops))
+    )
+    rows = res.all()
+    if not rows:
+        return 0
+    link_ids, user_ids, target_prices, min_drop_percents = zip(*rows)
+
+    # Per subscription prices, looked up once per product
+    products, index = np.unique(np.array(link_ids), return_inverse=True)
+    old_prices = np.array([drops[l].old_price for l in products], dtype=float)
+    new_prices = np.array([prices[l] for l in products], dtype=float)
+    mask = should_alert(
+        old_prices=old_prices[index],
+        new_prices=new_prices[index],
+        # None becomes NaN, meaning no threshold
+        target_prices=np.array(target_prices, dtype=float),
+        min_drop_percents=np.array(min_drop_percents, dtype=float),
+    )
+    selected = np.flatnonzero(mask)
+    logger.info(
+        f"Enqueueing {len(selected)} of {len(rows)} price drop notifications for {len(drops)} products"
+    )
+    if not len(selected):
+        return 0
+
+    now = datetime.datetime.utcnow()
+    db.execute(
+        _insert_skipping_existing(
+            models.NotificationOutbox.__table__, db.get_bind().dialect.name, "event_id"
+        ),
+        [
+            {
+                "event_id": drops[link_ids[i]].event_id,
+                "user_id": user_ids[i],
+                "link_id": link_ids[i],
+                "price": prices[link_ids[i]],
+                "status": "pending",
+                "attempts": 0,
+                "next_attempt_at": now,
+                "created_at": now,
+            }
+            for i in selected
+        ],
+    )
+    return len(selected)
+
+
+async def update_alert_threshold(
+    db: AsyncSession,
+    user_id: str,
+    link_id: str,
+    target_price: Optional[float],
+    min_drop_percent: Optional[float],
+) -> Union[schemas.SuccessResp, schemas.FailureResp]:
     try:
-        logger.info(f"Getting subscription by user id {user_id} and link id {link_id}")
+        logger.info(
+            f"Setting alert threshold of link id {link_id} for user id {user_id} to target price {target_price}, min drop {min_drop_percent}%"
+        )
         res = await db.execute(
-            select(models.Subscription).where(
+            update(models.Subscription)
+            .where(
                 models.Subscription.user_id == user_id,
                 models.Subscription.link_id == link_id,
             )
+            .values(target_price=target_price, min_drop_percent=min_drop_percent)
         )
-        subscription = res.scalar()
-        return subscription
+        await db.commit()
+        if not res.rowcount:
+            return schemas.FailureResp(
+                detail="The user has not subscribed to this product"
+            )
+        return schemas.SuccessResp(detail="Successfully updated the price alert")
     except Exception as err:
         logger.error(
-            f"Failed to get subscription by user id {user_id} and link id {link_id}. {err}"
+            f"Failed to set alert threshold of link id {link_id} for user id {user_id}. {err}"
         )
-        return None
-
-
-async def create_subscription(db: AsyncSession, user_id: str, link_id: str):
+        return schemas.FailureResp(detail="Failed to update the price alert")
+
+
+def claim_notifications(
+    db: Session,
+    limit: int,
+    lease_seconds: float,
+    digest_window: float,
+    max_attempts: int,
+) -> List[Row]:
+    """
+    Lease up to `limit` due outbox rows to the caller and return them joined with
+    the subscriber and the product.
+
+    Rows of users in digest mode only become due once the oldest of them has waited
+    `digest_window` seconds. Then all due rows of that user are claimed together,
+    so they can go out in one email.
+
+    Claiming counts as an attempt and pushes the next attempt `lease_seconds` into
+    the future, so the rows of a dispatcher that dies before it reports back are
+    picked up again once the lease runs out. Rows are locked with SKIP LOCKED,
+    dispatchers claiming at the same time never get the same rows. Rows whose lease
+    ran out after `max_attempts` claims are dead-lettered instead, so a row that
+    keeps crashing the dispatcher is not leased forever.
+    """
     try:
-        logger.info(f"Creating subscription by user id {user_id} and link id {link_id}")
-        subscription = models.Subscription(user_id=user_id, link_id=link_id)
-        db.add(subscription)
-        await db.commit()
+        now = datetime.datetime.utcnow()
+        expired = db.execute(
+            update(models.NotificationOutbox)
+            .where(
+                models.NotificationOutbox.status == "pending",
+                models.NotificationOutbox.next_attempt_at <= now,
+                models.NotificationOutbox.attempts >= max_attempts,
+            )
+            .values(
+                status="dead",
+                last_error=f"No result reported after {max_attempts} attempts",
+            )
+        ).rowcount
+        if expired:
+            logger.error(f"Dead-lettered {expired} notifications without a result")
+        digest = models.User.alert_mode == "digest"
+        due = (
+            select(
+                models.NotificationOutbox.id,
+                models.NotificationOutbox.user_id,
+                digest,
+            )
+            .outerjoin(
+                models.User, models.User.id == models.NotificationOutbox.user_id
+            )
+            .where(
+                models.NotificationOutbox.status == "pending",
+                models.NotificationOutbox.next_attempt_at <= now,
+                models.NotificationOutbox.attempts < max_attempts,
+            )
+            .with_for_update(skip_locked=True, of=models.NotificationOutbox)
+        )
+        res = db.execute(
+            due.where(
+                or_(
+                    ~digest,
+                    # No user row left, the outer join has no alert mode
+                    models.User.alert_mode.is_(None),
+                    models.NotificationOutbox.created_at
+                    <= now - datetime.timedelta(seconds=digest_window),
+                )
+            )
+            .order_by(models.NotificationOutbox.next_attempt_at)
+            .limit(limit)
+        )
+        ids = set()
+        digest_users = set()
+        for id, user_id, is_digest in res:
+            ids.add(id)
+            if is_digest:
+                digest_users.add(user_id)
+        if digest_users:
+            res = db.execute(
+                due.where(models.NotificationOutbox.user_id.in_(digest_users))
+            )
+            ids |= {id for id, _, _ in res}
+        if not ids:
+            db.commit()
+            return []
+        db.execute(
+            update(models.NotificationOutbox)
+            .where(models.NotificationOutbox.id.in_(ids))
+            .values(
+                attempts=models.NotificationOutbox.attempts + 1,
+                next_attempt_at=now + datetime.timedelta(seconds=lease_seconds),
+            )
+        )
+        db.commit()
+
+        res = db.execute(
+            select(
+                models.NotificationOutbox.id,
+                models.NotificationOutbox.event_id,
+                models.NotificationOutbox.user_id,
+                models.NotificationOutbox.link_id,
+                models.NotificationOutbox.price,
+                models.NotificationOutbox.attempts,
+                models.User.email,
+                models.User.alert_mode,
+                models.Product.title,
+                models.Product.link,
+                models.Product.vendor,
+            )
+            .outerjoin(
+                models.User, models.User.id == models.NotificationOutbox.user_id
+            )
+            .outerjoin(
+                models.Product,
+                models.Product.link_id == models.NotificationOutbox.link_id,
+            )
+            .where(models.NotificationOutbox.id.in_(ids))
+            .order_by(models.NotificationOutbox.id)
+        )
+        rows = res.all()
+        logger.info(f"Claimed {len(rows)} notifications")
+        return rows
+    except Exception as err:
+        db.rollback()
+        logger.error(f"Failed to claim notifications. {err}")
+        return []
+
+
+def finish_notifications(
+    db: Session,
+    sent_ids: List[int],
+    failed: Dict[int, str],
+    retry_at: Dict[int, datetime.datetime],
+) -> None:
+    """
+    Record the outcome of claimed notifications. `sent_ids` were delivered,
+    `failed` maps the others to their error. Failed rows in `retry_at` are tried
+    again at the given time, the rest are dead-lettered.
+    """
+    try:
+        now = datetime.datetime.utcnow()
+        if sent_ids:
+            db.execute(
+                update(models.NotificationOutbox)
+                .where(models.NotificationOutbox.id.in_(sent_ids))
+                .values(status="sent", sent_at=now, last_error=None)
+            )
+        if failed:
+            db.execute(
+                update(models.NotificationOutbox)
+                .where(models.NotificationOutbox.id.in_(failed))
+                .values(last_error=case(failed, value=models.NotificationOutbox.id))
+                .execution_options(synchronize_session=False)
+            )
+        if retry_at:
+            db.execute(
+                update(models.NotificationOutbox)
+                .where(models.NotificationOutbox.id.in_(retry_at))
+                .values(
+                    next_attempt_at=case(retry_at, value=models.NotificationOutbox.id)
+                )
+                .execution_options(synchronize_session=False)
+            )
+        dead_ids = [id for id in failed if id not in retry_at]
+        if dead_ids:
+            db.execute(
+                update(models.NotificationOutbox)
+                .where(models.NotificationOutbox.id.in_(dead_ids))
+                .values(status="dead")
+            )
+        db.commit()
         logger.info(
-            f"Successfully created subscription for user id {user_id} and link id {link_id}"
+            f"Notifications sent: {len(sent_ids)}, retried: {len(retry_at)}, dead: {len(dead_ids)}"
         )
-        return "Success"
     except Exception as err:
-        logger.error(
-            f"Failed ti create subscription by user id {user_id} and link id {link_id}. {err}"
+        db.rollback()
+        logger.error(f"Failed to record the outcome of notifications. {err}")
+
+
+def count_subscribers(db: Session, link_ids: List[str]) -> Dict[str, int]:
+    """
+    Number of subscribers of each of the given products that has at least one.
+    """
+    logger.info(f"Counting subscribers of {len(link_ids)} products")
+    res = db.execute(
+        select(models.Subscription.link_id, func.count())
+        .where(models.Subscription.link_id.in_(link_ids))
+        .group_by(models.Subscription.link_id)
+    )
+    return {link_id: count for link_id, count in res}
+
+
+def get_product_rows(
+    db: Session,
+    limit: int,
+    after: Optional[str] = None,
+    link_ids: Optional[List[str]] = None,
+) -> List[Row]:
+    """
+    Read up to `limit` products ordered by link id as plain rows, without loading
+    ORM objects. Pass the last link id of the previous page as `after` to page
+    through the whole table, or restrict the rows to `link_ids`.
+    """
+    query = select(
+        models.Product.link_id,
+        models.Product.vendor,
+        models.Product.link,
+        models.Product.title,
+        models.Product.price,
+    )
+    if after is not None:
+        query = query.where(models.Product.link_id > after)
+    if link_ids is not None:
+        query = query.where(models.Product.link_id.in_(link_ids))
+    res = db.execute(query.order_by(models.Product.link_id).limit(limit))
+    return res.all()
+
+
+def claim_products(
+    db: Session, owner: str, limit: int, lease_seconds: float
+) -> List[str]:
+    """
+    Lease up to `limit` products that no live worker holds to `owner`.
+
+    Products get a lease row the first time they are seen. Rows whose lease is
+    missing or expired are locked with SELECT ... FOR UPDATE SKIP LOCKED, so
+    workers claiming at the same time never get the same product.
+    """
+    try:
+        now = datetime.datetime.utcnow()
+        # Aliased, the target table is referenced again by ON DUPLICATE KEY UPDATE
+        existing = aliased(models.ProductLease)
+        db.execute(
+            _insert_skipping_existing(
+                models.ProductLease.__table__, db.get_bind().dialect.name, "link_id"
+            ).from_select(
+                ["link_id"],
+                select(models.Product.link_id)
+                .outerjoin(existing, existing.link_id == models.Product.link_id)
+                .where(existing.link_id.is_(None)),
+            )
+        )
+        db.commit()
+
+        res = db.execute(
+            select(models.ProductLease.link_id)
+            .where(
+                or_(
+                    models.ProductLease.owner.is_(None),
+                    models.ProductLease.expires_at < now,
+                )
+            )
+            .order_by(models.ProductLease.expires_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
         )
+        link_ids = list(res.scalars().all())
+        if link_ids:
+            db.execute(
+                update(models.ProductLease)
+                .where(models.ProductLease.link_id.in_(link_ids))
+                .values(
+                    owner=owner,
+                    expires_at=now + datetime.timedelta(seconds=lease_seconds),
+                )
+            )
+        db.commit()
+        logger.info(f"Worker {owner} claimed {len(link_ids)} products")
+        return link_ids
+    except Exception as err:
+        db.rollback()
+        logger.error(f"Worker {owner} failed to claim products. {err}")
+        return []
 
 
-async def get_all_sub(
-    db: AsyncSession, user_id: str
-) -> Optional[List[schemas.Subscription]]:
+def renew_leases(db: Session, owner: str, lease_seconds: float) -> Set[str]:
+    """
+    Record a heartbeat for `owner`, extend every lease it still holds and return
+    their link ids. Leases that already expired are not renewed, another worker may
+    have claimed them. Leases of products that no longer exist are dropped.
+    """
     try:
-        logger.info(f"Getting all subscriptions for user with user id {user_id}")
-        res = await db.execute(
-            select(models.Subscription).where(models.Subscription.user_id == user_id)
+        now = datetime.datetime.utcnow()
+        db.merge(models.MonitorWorker(id=owner, last_seen=now))
+        db.execute(
+            delete(models.ProductLease).where(
+                models.ProductLease.owner == owner,
+                ~select(models.Product.link_id)
+                .where(models.Product.link_id == models.ProductLease.link_id)
+                .exists(),
+            )
+        )
+        db.execute(
+            update(models.ProductLease)
+            .where(
+                models.ProductLease.owner == owner,
+                models.ProductLease.expires_at >= now,
+            )
+            .values(expires_at=now + datetime.timedelta(seconds=lease_seconds))
+        )
+        res = db.execute(
+            select(models.ProductLease.link_id).where(
+                models.ProductLease.owner == owner,
+                models.ProductLease.expires_at >= now,
+            )
         )
-        subscriptions = res.scalars().all()
-        return subscriptions
+        link_ids = set(res.scalars().all())
+        db.commit()
+        return link_ids
     except Exception as err:
-        logger.error(
-            f"Failed to get all subscriptions for user with user id {user_id}. {err}"
+        db.rollback()
+        logger.error(f"Worker {owner} failed to renew its leases. {err}")
+        return set()
+
+
+def release_leases(
+    db: Session, owner: str, link_ids: Optional[List[str]] = None
+) -> None:
+    """
+    Give up the leases of `link_ids`. Without `link_ids` the worker is shutting down,
+    so all its leases and its heartbeat are removed.
+    """
+    try:
+        query = update(models.ProductLease).where(models.ProductLease.owner == owner)
+        if link_ids is not None:
+            query = query.where(models.ProductLease.link_id.in_(link_ids))
+        else:
+            db.execute(
+                delete(models.MonitorWorker).where(models.MonitorWorker.id == owner)
+            )
+        db.execute(query.values(owner=None, expires_at=None))
+        db.commit()
+    except Exception as err:
+        db.rollback()
+        logger.error(f"Worker {owner} failed to release its leases. {err}")
+
+
+def count_workers(db: Session, lease_seconds: float) -> Tuple[int, int]:
+    """
+    Return the number of products and the number of workers with a heartbeat in
+    the last `lease_seconds`.
+    """
+    since = datetime.datetime.utcnow() - datetime.timedelta(seconds=lease_seconds)
+    products = db.execute(select(func.count()).select_from(models.Product)).scalar()
+    workers = db.execute(
+        select(func.count())
+        .select_from(models.MonitorWorker)
+        .where(models.MonitorWorker.last_seen >= since)
+    ).scalar()
+    return products, workers
+
+
+# Length in seconds of each rollup resolution
+ROLLUP_SECONDS = {"hour": 3600, "day": 86400}
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def to_naive_utc(ts: datetime.datetime) -> datetime.datetime:
+    """
+    `ts` as the naive UTC datetime the price history is stored in. Aware datetimes
+    are converted, naive ones are taken to be in UTC already.
+    """
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _period_start(ts: datetime.datetime, resolution: int) -> datetime.datetime:
+    seconds = int((to_naive_utc(ts) - _EPOCH).total_seconds())
+    return _EPOCH + datetime.timedelta(seconds=seconds - seconds % resolution)
+
+
+def add_price_observations(
+    db: Session, observations: List[Tuple[str, datetime.datetime, float]]
+) -> int:
+    """
+    Append (link_id, observed_at, price) observations to the price history.
+
+    The raw rows and the hourly and daily rollups they fall into are written in one
+    transaction, so the rollups are always up to date and reading a range never
+    has to touch the raw rows. Returns the number of observations written.
+    """
+    if not observations:
+        return 0
+    try:
+        logger.info(f"Recording {len(observations)} price observations")
+        link_ids = {link_id for link_id, _, _ in observations}
+        # Observations that were already recorded must not be counted twice
+        res = db.execute(
+            select(
+                models.PriceObservation.link_id, models.PriceObservation.observed_at
+            ).where(
+                models.PriceObservation.link_id.in_(link_ids),
+                models.PriceObservation.observed_at.in_(
+                    {observed_at for _, observed_at, _ in observations}
+                ),
+            )
         )
-        return None
+        seen = set(res.all())
+        new_observations = []
+        for link_id, observed_at, price in observations:
+            if (link_id, observed_at) not in seen:
+                seen.add((link_id, observed_at))
+                new_observations.append((link_id, observed_at, price))
+        observations = new_observations
+        if not observations:
+            return 0
+
+        db.execute(
+            insert(models.PriceObservation),
+            [
+                {"link_id": link_id, "observed_at": observed_at, "price": price}
+                for link_id, observed_at, price in observations
+            ],
+        )
+
+        for resolution in ROLLUP_SECONDS.values():
+            periods = {
+                (link_id, _period_start(observed_at, resolution))
+                for link_id, observed_at, _ in observations
+            }
+            res = db.execute(
+                select(models.PriceRollup).where(
+                    models.PriceRollup.link_id.in_(link_ids),
+                    models.PriceRollup.resolution == resolution,
+                    models.PriceRollup.period_start.in_({p for _, p in periods}),
+                )
+            )
+            rollups = {
+                (r.link_id, r.period_start): r
+                for r in res.scalars().all()
+                if (r.link_id, r.period_start) in periods
+            }
+            for link_id, observed_at, price in sorted(observations, key=lambda o: o[1]):
+                key = (link_id, _period_start(observed_at, resolution))
+                rollup = rollups.get(key)
+                if rollup is None:
+                    rollup = models.PriceRollup(
+                        link_id=link_id,
+                        resolution=resolution,
+                        period_start=key[1],
+                        min_price=price,
+                        max_price=price,
+                        last_price=price,
+                        last_at=observed_at,
+                        samples=1,
+                    )
+                    db.add(rollup)
+                    rollups[key] = rollup
+                    continue
+                rollup.min_price = min(float(rollup.min_price), price)
+                rollup.max_price = max(float(rollup.max_price), price)
+                if observed_at >= rollup.last_at:
+                    rollup.last_price = price
+                    rollup.last_at = observed_at
+                rollup.samples += 1
+        db.commit()
+        return len(observations)
+    except Exception as err:
+        db.rollback()
+        logger.error(f"Failed to record {len(observations)} price observations. {err}")
+        return 0
+
+
+def prune_price_history(
+    db: Session, raw_before: datetime.datetime, hourly_before: datetime.datetime
+) -> Tuple[int, int]:
+    """
+    Downsample old price history. Raw observations older than `raw_before` and
+    hourly rollups older than `hourly_before` are deleted, their data lives on in
+    the coarser rollups. Daily rollups are kept forever. Returns the number of raw
+    rows and hourly rollups deleted.
+    """
+    try:
+        raw = db.execute(
+            delete(models.PriceObservation).where(
+                models.PriceObservation.observed_at < raw_before
+            )
+        ).rowcount
+        hourly = db.execute(
+            delete(models.PriceRollup).where(
+                models.PriceRollup.resolution == ROLLUP_SECONDS["hour"],
+                models.PriceRollup.period_start < hourly_before,
+            )
+        ).rowcount
+        db.commit()
+        logger.info(
+            f"Pruned {raw} price observations and {hourly} hourly price rollups"
+        )
+        return raw, hourly
+    except Exception as err:
+        db.rollback()
+        logger.error(f"Failed to prune the price history. {err}")
+        return 0, 0
+
+
+async def get_price_rollups(
+    db: AsyncSession,
+    link_id: str,
+    resolution: schemas.HistoryResolution,
+    start: datetime.datetime,
+    end: datetime.datetime,
+) -> List[models.PriceRollup]:
+    try:
+        logger.info(
+            f"Getting {resolution} price rollups of link id {link_id} from {start} to {end}"
+        )
+        res = await db.execute(
+            select(models.PriceRollup)
+            .where(
+                models.PriceRollup.link_id == link_id,
+                models.PriceRollup.resolution == ROLLUP_SECONDS[resolution],
+                models.PriceRollup.period_start
+                >= _period_start(start, ROLLUP_SECONDS[resolution]),
+                models.PriceRollup.period_start < to_naive_utc(end),
+            )
+            .order_by(models.PriceRollup.period_start)
+        )
+        return list(res.scalars().all())
+    except Exception as err:
+        logger.error(f"Failed to get price rollups of link id {link_id}. {err}")
+        return []
 
 
 async def unsubscribe(
@@ -215,7 +928,9 @@ async def unsubscribe(
         # Now we check in the subscription table if there is another row with the same link_id
 
         res = await db.execute(
-            select(models.Subscription).where(models.Subscription.link_id == link_id)
+            select(models.Subscription.link_id)
+            .where(models.Subscription.link_id == link_id)
+            .limit(1)
         )
         subscription = res.scalar()
         # If there is another subscription in there, we do nothing,
@@ -0,0 +1,148 @@
+"""
+Check that lookups of subscriptions by product use the subscription.link_id index.
+
+Seeds synthetic users, products and subscriptions into the configured database,
+prints the query plan of each lookup and times it with and without the index:
+
+    python -m db.explain --products 5000 --users 2000 --subscriptions-per-user 20
+
+The seeded rows all have ids starting with "seed-" and are deleted afterwards
+unless --keep is given.
+"""
+
+import argparse
+import random
+import re
+import time
+from typing import Dict, List
+
+from sqlalchemy import bindparam, delete, insert, text
+from sqlalchemy.engine import Connection
+
+from db import models
+from db.base import sync_engine
+
+
+SEED_PREFIX = "seed-"
+INDEX = "ix_subscription_link_id"
+
+# {hint} is replaced by nothing, or by a hint that keeps the index from being used
+QUERIES = {
+    "subscribers of a product": (
+        "SELECT user_id FROM subscription {hint} WHERE link_id = :link_id"
+    ),
+    "any subscriber left": (
+        "SELECT link_id FROM subscription {hint} WHERE link_id = :link_id LIMIT 1"
+    ),
+    "subscriber counts": (
+        "SELECT link_id, COUNT(*) FROM subscription {hint} "
+        "WHERE link_id IN :link_ids GROUP BY link_id"
+    ),
+}
+
+
+def seed(conn: Connection, products: int, users: int, per_user: int) -> List[str]:
+    link_ids = [f"{SEED_PREFIX}p{i}" for i in range(products)]
+    conn.execute(
+        insert(models.Product),
+        [
+            {"link_id": link_id, "title": link_id, "vendor": 1, "price": 10}
+            for link_id in link_ids
+        ],
+    )
+    conn.execute(
+        insert(models.User),
+        [
+            {"id": f"{SEED_PREFIX}u{i}", "email": f"{SEED_PREFIX}u{i}"}
+            for i in range(users)
+        ],
+    )
+    rows = [
+        {"user_id": f"{SEED_PREFIX}u{i}", "link_id": link_id}
+        for i in range(users)
+        for link_id in random.sample(link_ids, min(per_user, products))
+    ]
+    for start in range(0, len(rows), 10000):
+        conn.execute(insert(models.Subscription), rows[start : start + 10000])
+    conn.commit()
+    return link_ids
+
+
+def cleanup(conn: Connection) -> None:
+    for model, column in [
+        (models.Subscription, models.Subscription.user_id),
+        (models.Product, models.Product.link_id),
+        (models.User, models.User.id),
+    ]:
+        conn.execute(delete(model).where(column.like(f"{SEED_PREFIX}%")))
+    conn.commit()
+
+
+def without_index_hint(conn: Connection) -> str:
+    if conn.dialect.name == "sqlite":
+        return "NOT INDEXED"
+    return f"IGNORE INDEX ({INDEX})"
+
+
+def explain(conn: Connection, sql: str, params: Dict) -> List[str]:
+    prefix = "EXPLAIN QUERY PLAN" if conn.dialect.name == "sqlite" else "EXPLAIN"
+    statement = text(f"{prefix} {sql}").bindparams(*_expanding(params))
+    return [str(dict(row._mapping)) for row in conn.execute(statement, params)]
+
+
+def timed(conn: Connection, sql: str, params: Dict, repeat: int) -> float:
+    statement = text(sql).bindparams(*_expanding(params))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(statement, params).all()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def _expanding(params: Dict) -> list:
+    # List parameters are rendered as IN (...)
+    return [
+        bindparam(k, expanding=True) for k, v in params.items() if isinstance(v, list)
+    ]
+
+
+def main(args: argparse.Namespace) -> None:
+    with sync_engine.connect() as conn:
+        link_ids = seed(
+            conn,
+            products=args.products,
+            users=args.users,
+            per_user=args.subscriptions_per_user,
+        )
+        try:
+            params = {
+                "link_id": random.choice(link_ids),
+                "link_ids": random.sample(link_ids, min(100, len(link_ids))),
+            }
+            for name, sql in QUERIES.items():
+                query_params = {
+                    k: v for k, v in params.items() if re.search(rf":{k}\b", sql)
+                }
+                with_index = sql.format(hint="")
+                without_index = sql.format(hint=without_index_hint(conn))
+                print(f"{name}:")
+                for row in explain(conn, with_index, query_params):
+                    print(f"    {row}")
+                fast = timed(conn, with_index, query_params, repeat=args.repeat)
+                slow = timed(conn, without_index, query_params, repeat=args.repeat)
+                print(
+                    f"    {fast:.3f} ms with the index, {slow:.3f} ms without "
+                    f"({slow / fast:.1f}x)"
+                )
+        finally:
+            if not args.keep:
+                cleanup(conn)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--subscriptions-per-user", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded rows")
+    main(parser.parse_args())
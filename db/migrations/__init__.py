@@ -0,0 +1,73 @@
+import datetime
+import importlib
+import pkgutil
+from types import ModuleType
+from typing import List, Optional
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.engine import Connection
+
+from db import models
+from lib.logger import get_logger
+
+
+logger = get_logger(name=__name__, filename="log/db.log")
+
+# Held while migrating, so API processes starting together do not race
+LOCK_NAME = "price_sentry_migrations"
+
+
+def get_migrations() -> List[ModuleType]:
+    """
+    Every migration in this package ordered by version. A migration is a module
+    named `v<version>_<name>` with a `DESCRIPTION` and an `upgrade(conn)` function.
+    Migrations must be safe to run again on a schema they already changed.
+    """
+    migrations = []
+    for module in pkgutil.iter_modules(__path__):
+        if module.name.startswith("v") and module.name[1:5].isdigit():
+            migration = importlib.import_module(f"{__name__}.{module.name}")
+            migration.VERSION = int(module.name[1:5])
+            migrations.append(migration)
+    return sorted(migrations, key=lambda m: m.VERSION)
+
+
+def current_version(conn: Connection) -> int:
+    models.SchemaVersion.__table__.create(bind=conn, checkfirst=True)
+    version = conn.execute(select(func.max(models.SchemaVersion.version))).scalar()
+    return version or 0
+
+
+def upgrade(conn: Connection, target: Optional[int] = None) -> int:
+    """
+    Apply the migrations newer than the current version, up to `target` or all of
+    them, and return the resulting version. Every migration is recorded in the
+    schema_version table right after it ran.
+    """
+    locked = conn.dialect.name == "mysql"
+    if locked:
+        conn.execute(text("SELECT GET_LOCK(:name, 600)"), {"name": LOCK_NAME})
+    try:
+        version = current_version(conn)
+        for migration in get_migrations():
+            if migration.VERSION <= version:
+                continue
+            if target is not None and migration.VERSION > target:
+                break
+            logger.info(
+                f"Migrating to version {migration.VERSION}: {migration.DESCRIPTION}"
+            )
+            migration.upgrade(conn)
+            conn.execute(
+                insert(models.SchemaVersion).values(
+                    version=migration.VERSION,
+                    description=migration.DESCRIPTION,
+                    applied_at=datetime.datetime.utcnow(),
+                )
+            )
+            conn.commit()
+            version = migration.VERSION
+        return version
+    finally:
+        if locked:
+            conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
@@ -0,0 +1,27 @@
+import argparse
+
+from db.base import sync_engine
+from db.migrations import current_version, get_migrations, upgrade
+
+
+if __name__ == "__main__":
+    # Upgrade the database in place, e.g.
+    #   python -m db.migrations upgrade
+    #   python -m db.migrations status
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["upgrade", "status"])
+    parser.add_argument(
+        "--target", type=int, default=None, help="Stop at this version"
+    )
+    args = parser.parse_args()
+
+    with sync_engine.connect() as conn:
+        if args.command == "upgrade":
+            version = upgrade(conn, target=args.target)
+            print(f"Database is at version {version}")
+        else:
+            version = current_version(conn)
+            conn.commit()
+            for migration in get_migrations():
+                state = "applied" if migration.VERSION <= version else "pending"
+                print(f"{migration.VERSION:04d} {state:>8}  {migration.DESCRIPTION}")
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateColumn
+
+
+def has_table(conn: Connection, table: str) -> bool:
+    return inspect(conn).has_table(table)
+
+
+def has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def has_index(conn: Connection, table: str, index: str) -> bool:
+    return any(i["name"] == index for i in inspect(conn).get_indexes(table))
+
+
+def has_foreign_key(conn: Connection, table: str, foreign_key: str) -> bool:
+    return any(
+        fk["name"] == foreign_key for fk in inspect(conn).get_foreign_keys(table)
+    )
+
+
+def add_column(conn: Connection, table: str, column: Column) -> None:
+    """
+    Add `column` to `table` unless it is already there.
+    """
+    if has_column(conn, table, column.name):
+        return
+    preparer = conn.dialect.identifier_preparer
+    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {preparer.quote(table)} ADD COLUMN {ddl}"))
@@ -0,0 +1,14 @@
+from sqlalchemy.engine import Connection
+
+from db.base import Base
+
+
+DESCRIPTION = "Create the tables that do not exist yet"
+
+
+def upgrade(conn: Connection) -> None:
+    # Fresh databases get the whole current schema here, the later migrations then
+    # find their changes already in place. Existing tables are left alone.
+    from db import models  # noqa: F401, registers the tables on Base.metadata
+
+    Base.metadata.create_all(bind=conn)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String
+from sqlalchemy.engine import Connection
+
+from db.migrations.helpers import add_column
+
+
+DESCRIPTION = "Add user.alert_mode for digest alerts"
+
+
+def upgrade(conn: Connection) -> None:
+    add_column(
+        conn,
+        "user",
+        Column("alert_mode", String(16), nullable=False, server_default="instant"),
+    )
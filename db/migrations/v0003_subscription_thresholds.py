@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Float
+from sqlalchemy.engine import Connection
+from sqlalchemy.types import DECIMAL
+
+from db.migrations.helpers import add_column
+
+
+DESCRIPTION = "Add subscription.target_price and subscription.min_drop_percent"
+
+
+def upgrade(conn: Connection) -> None:
+    add_column(
+        conn,
+        "subscription",
+        Column("target_price", DECIMAL(precision=10, scale=2), nullable=True),
+    )
+    add_column(conn, "subscription", Column("min_drop_percent", Float, nullable=True))
@@ -0,0 +1,15 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from db.migrations.helpers import has_index
+
+
+DESCRIPTION = "Index subscription.link_id for lookups by product"
+
+
+def upgrade(conn: Connection) -> None:
+    # The primary key (user_id, link_id) only helps lookups by user
+    if not has_index(conn, "subscription", "ix_subscription_link_id"):
+        conn.execute(
+            text("CREATE INDEX ix_subscription_link_id ON subscription (link_id)")
+        )
@@ -0,0 +1,42 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from db.migrations.helpers import has_foreign_key
+from lib.logger import get_logger
+
+
+DESCRIPTION = "Reference product from subscription.link_id"
+
+logger = get_logger(name=__name__, filename="log/db.log")
+
+ORPHANS = "FROM subscription WHERE link_id NOT IN (SELECT link_id FROM product)"
+
+
+def upgrade(conn: Connection) -> None:
+    if has_foreign_key(conn, "subscription", "fk_subscription_product"):
+        return
+
+    # Subscriptions of products that no longer exist would make adding the
+    # constraint fail. They are users' data, so someone has to decide about them
+    orphans = conn.execute(text(f"SELECT COUNT(*) {ORPHANS}")).scalar()
+    if orphans:
+        examples = conn.execute(
+            text(f"SELECT DISTINCT link_id {ORPHANS} LIMIT 5")
+        ).scalars()
+        message = (
+            f"{orphans} subscriptions reference products that do not exist, e.g. "
+            f"link ids {', '.join(examples)}. Restore the products, or delete the "
+            f"subscriptions with DELETE {ORPHANS}, then migrate again"
+        )
+        logger.error(message)
+        raise RuntimeError(message)
+
+    if conn.dialect.name == "sqlite":
+        # SQLite cannot add a constraint to an existing table
+        return
+    conn.execute(
+        text(
+            "ALTER TABLE subscription ADD CONSTRAINT fk_subscription_product "
+            "FOREIGN KEY (link_id) REFERENCES product (link_id) ON DELETE CASCADE"
+        )
+    )
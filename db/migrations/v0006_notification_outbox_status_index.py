@@ -0,0 +1,26 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from db.migrations.helpers import has_index
+
+
+DESCRIPTION = "Index notification_outbox on (status, next_attempt_at)"
+
+OLD_INDEX = "ix_notification_outbox_next_attempt_at"
+NEW_INDEX = "ix_notification_outbox_status_next_attempt_at"
+
+
+def upgrade(conn: Connection) -> None:
+    # With next_attempt_at alone, claiming walks every sent and dead row as well
+    if not has_index(conn, "notification_outbox", NEW_INDEX):
+        conn.execute(
+            text(
+                f"CREATE INDEX {NEW_INDEX} "
+                "ON notification_outbox (status, next_attempt_at)"
+            )
+        )
+    if has_index(conn, "notification_outbox", OLD_INDEX):
+        if conn.dialect.name == "mysql":
+            conn.execute(text(f"DROP INDEX {OLD_INDEX} ON notification_outbox"))
+        else:
+            conn.execute(text(f"DROP INDEX {OLD_INDEX}"))
@@ -1,4 +1,15 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    DateTime,
+    Text,
+    UniqueConstraint,
+)
 from sqlalchemy.types import DECIMAL, SmallInteger
 from .base import Base
 
@@ -10,6 +21,10 @@ class User(Base):
     email = Column(String(64), unique=True, index=True)
     first_name = Column(String(30))
     last_name = Column(String(30))
+    # "instant" sends one email per price drop, "digest" groups them per user
+    alert_mode = Column(
+        String(16), nullable=False, default="instant", server_default="instant"
+    )
 
 
 class Product(Base):
@@ -27,4 +42,93 @@ class Subscription(Base):
     __tablename__ = "subscription"
 
     user_id = Column(String(64), primary_key=True)
+    # Indexed on its own for lookups of the subscribers of a product
+    link_id = Column(
+        String(64),
+        ForeignKey(
+            "product.link_id", name="fk_subscription_product", ondelete="CASCADE"
+        ),
+        primary_key=True,
+        index=True,
+    )
+    # Optional alert thresholds, without them every price drop is an alert
+    target_price = Column(DECIMAL(precision=10, scale=2), nullable=True)
+    min_drop_percent = Column(Float, nullable=True)
+
+
+class SearchCache(Base):
+    __tablename__ = "search_cache"
+
+    key = Column(String(64), primary_key=True)
+    value = Column(Text(length=16777215))
+    expires_at = Column(DateTime, index=True)
+
+
+class ProductLease(Base):
+    __tablename__ = "product_lease"
+
+    link_id = Column(String(64), primary_key=True)
+    owner = Column(String(64), index=True)
+    expires_at = Column(DateTime, index=True)
+
+
+class MonitorWorker(Base):
+    __tablename__ = "monitor_worker"
+
+    id = Column(String(64), primary_key=True)
+    last_seen = Column(DateTime, index=True)
+
+
+class PriceObservation(Base):
+    __tablename__ = "price_observation"
+
     link_id = Column(String(64), primary_key=True)
+    observed_at = Column(DateTime, primary_key=True)
+    price = Column(DECIMAL(precision=10, scale=2))
+
+
+class PriceRollup(Base):
+    __tablename__ = "price_rollup"
+
+    link_id = Column(String(64), primary_key=True)
+    # Length of the period in seconds, 3600 for hourly and 86400 for daily rollups
+    resolution = Column(Integer, primary_key=True)
+    period_start = Column(DateTime, primary_key=True)
+    min_price = Column(DECIMAL(precision=10, scale=2))
+    max_price = Column(DECIMAL(precision=10, scale=2))
+    last_price = Column(DECIMAL(precision=10, scale=2))
+    last_at = Column(DateTime)
+    samples = Column(Integer)
+
+
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+    # One row per price drop and subscriber, enqueueing the same drop twice is a no-op
+    __table_args__ = (
+        UniqueConstraint("event_id", "user_id"),
+        # Claims scan the due pending rows only, not the sent and dead ones
+        Index(
+            "ix_notification_outbox_status_next_attempt_at", "status", "next_attempt_at"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event_id = Column(String(64))
+    user_id = Column(String(64))
+    link_id = Column(String(64))
+    price = Column(DECIMAL(precision=10, scale=2))
+    # "pending", "sent" or "dead"
+    status = Column(String(16), default="pending")
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime)
+    last_error = Column(String(1024))
+    created_at = Column(DateTime)
+    sent_at = Column(DateTime)
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    description = Column(String(256))
+    applied_at = Column(DateTime)
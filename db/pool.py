@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Dict, Type
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+
+class PoolStats:
+    """
+    Counters of a connection pool, fed by its events and by `timed_pool_class`.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+    def attach(self, engine: Engine) -> None:
+        def on_connect(*args) -> None:
+            with self._lock:
+                self.connects += 1
+
+        def on_invalidate(*args) -> None:
+            with self._lock:
+                self.invalidations += 1
+
+        event.listen(engine, "connect", on_connect)
+        event.listen(engine, "invalidate", on_invalidate)
+
+    def snapshot(self, pool: Pool) -> Dict[str, float]:
+        with self._lock:
+            waits = self.checkouts + self.timeouts
+            return {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                # Negative while the pool has not opened `size` connections yet
+                "overflow": pool.overflow(),
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": self.wait_total / waits * 1000 if waits else 0.0,
+                "wait_max_ms": self.wait_max * 1000,
+            }
+
+
+def timed_pool_class(base: Type[Pool], stats: PoolStats) -> Type[Pool]:
+    """
+    Subclass of the pool class `base` that records in `stats` how long every
+    checkout waited for a connection, including the time to open a new one.
+    """
+
+    class TimedPool(base):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except exc.TimeoutError:
+                stats.record_wait(time.perf_counter() - start, timed_out=True)
+                raise
+            stats.record_wait(time.perf_counter() - start)
+            return conn
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
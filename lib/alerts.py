@@ -0,0 +1,33 @@
+from typing import NamedTuple
+
+import numpy as np
+
+
+class PriceDrop(NamedTuple):
+    # Identifies the drop, enqueueing the same drop twice is a no-op
+    event_id: str
+    old_price: float
+
+
+def should_alert(
+    old_prices: np.ndarray,
+    new_prices: np.ndarray,
+    target_prices: np.ndarray,
+    min_drop_percents: np.ndarray,
+) -> np.ndarray:
+    """
+    Decide for many subscriptions at once whether a price change is worth an alert.
+
+    All arguments are float arrays with one entry per subscription, NaN standing for
+    a threshold the subscriber did not set. A subscriber is alerted when the price
+    dropped, the new price is at or below their target price and the drop is at
+    least their minimum drop, in percent of the old price. A missing (NaN) old price
+    is never a drop, nor is a negative new price, the scraper's marker for a price
+    it could not read. Returns a boolean mask.
+    """
+    dropped = (new_prices < old_prices) & (new_prices >= 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drop_percents = (old_prices - new_prices) / old_prices * 100
+    below_target = np.isnan(target_prices) | (new_prices <= target_prices)
+    big_enough = np.isnan(min_drop_percents) | (drop_percents >= min_drop_percents)
+    return dropped & below_target & big_enough
@@ -0,0 +1,186 @@
+import datetime
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from db import models
+from db.base import SyncSessionLocal
+from lib import schemas
+from lib.utils import get_logger, hash256
+from config import get_settings
+
+
+logger = get_logger(name=__name__, filename="log/cache.log")
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries expire after ``ttl`` seconds
+    as measured by ``clock``.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 256,
+        ttl: float = 900,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expiry_time = entry
+            if expiry_time <= self.clock():
+                self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class DbCacheBackend:
+    """
+    Cache backend stored in the ``search_cache`` table, so every API worker
+    connected to the same database shares its entries.
+    """
+
+    def __init__(
+        self, ttl: float = 900, clock: Callable[[], float] = time.time
+    ) -> None:
+        self.ttl = ttl
+        self.clock = clock
+
+    def _now(self) -> datetime.datetime:
+        # The table stores naive UTC datetimes
+        return datetime.datetime.utcfromtimestamp(self.clock())
+
+    def get(self, key: str) -> Optional[str]:
+        db = SyncSessionLocal()
+        try:
+            entry = (
+                db.query(models.SearchCache)
+                .filter(
+                    models.SearchCache.key == key,
+                    models.SearchCache.expires_at > self._now(),
+                )
+                .first()
+            )
+            return entry.value if entry else None
+        except Exception as err:
+            logger.error(f"Failed to read cache entry {key}. {err}")
+            return None
+        finally:
+            db.close()
+
+    def set(self, key: str, value: str) -> None:
+        db = SyncSessionLocal()
+        try:
+            now = self._now()
+            db.merge(
+                models.SearchCache(
+                    key=key,
+                    value=value,
+                    expires_at=now + datetime.timedelta(seconds=self.ttl),
+                )
+            )
+            db.query(models.SearchCache).filter(
+                models.SearchCache.expires_at <= now
+            ).delete()
+            db.commit()
+        except Exception as err:
+            db.rollback()
+            logger.error(f"Failed to write cache entry {key}. {err}")
+        finally:
+            db.close()
+
+
+class SearchCache:
+    """
+    Cache of product search results keyed on the normalized query.
+
+    Entries are always kept in a local LRU. When a shared backend is configured it is
+    consulted on a local miss and written on every store, so other workers can reuse
+    the result.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 256,
+        ttl: float = 900,
+        shared: Optional[DbCacheBackend] = None,
+    ) -> None:
+        self.local = TTLCache(max_size=max_size, ttl=ttl)
+        self.shared = shared
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(
+        vendor: str, kw: str, include: Optional[str], max_prod: int
+    ) -> str:
+        # Case, extra whitespace and the order of the include words do not change
+        # the result of a search
+        kw = " ".join(kw.lower().split())
+        include = " ".join(sorted(set((include or "").lower().split())))
+        return hash256(keyword=f"{vendor}|{kw}|{include}|{max_prod}")
+
+    def get(self, key: str) -> Optional[List[schemas.Product]]:
+        products = self.local.get(key)
+        if products is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                products = [schemas.Product(**p) for p in json.loads(value)]
+                self.local.set(key, products)
+        with self._lock:
+            if products is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return products
+
+    def set(self, key: str, products: List[schemas.Product]) -> None:
+        self.local.set(key, products)
+        if self.shared is not None:
+            self.shared.set(key, json.dumps([p.model_dump() for p in products]))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.local),
+            }
+
+
+@lru_cache
+def get_search_cache() -> SearchCache:
+    settings = get_settings()
+    shared = None
+    if settings.search_cache_backend == "db":
+        shared = DbCacheBackend(ttl=settings.search_cache_ttl)
+    return SearchCache(
+        max_size=settings.search_cache_size,
+        ttl=settings.search_cache_ttl,
+        shared=shared,
+    )
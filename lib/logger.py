@@ -0,0 +1,17 @@
+import logging
+
+
+def get_logger(
+    name: str,
+    filename: str,
+    filemode: str = "a",
+    level=logging.INFO,
+    fmt="%(asctime)s - %(levelname)s - %(message)s",
+) -> logging.Logger:
+    logger = logging.getLogger(name=name)
+    logger.setLevel(level=level)
+    formatter = logging.Formatter(fmt=fmt)
+    file_handler = logging.FileHandler(filename=filename, mode=filemode)
+    file_handler.setFormatter(fmt=formatter)
+    logger.addHandler(hdlr=file_handler)
+    return logger
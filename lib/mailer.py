@@ -0,0 +1,178 @@
+import queue
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from functools import lru_cache
+from typing import Dict, Optional
+
+from config import get_settings
+from lib.logger import get_logger
+
+
+logger = get_logger(name=__name__, filename="log/mailer.log")
+
+
+class _Connection:
+    def __init__(self, smtp: smtplib.SMTP) -> None:
+        self.smtp = smtp
+        self.sent = 0
+
+
+class SmtpPool:
+    """
+    Small pool of authenticated SMTP connections.
+
+    Connections are opened lazily, kept open between messages and reused for up to
+    ``max_messages_per_connection`` messages before being replaced. A message whose
+    connection turns out to be dead is retried once on a fresh connection.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = True,
+        size: int = 2,
+        max_messages_per_connection: int = 100,
+        timeout: float = 30,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.max_messages_per_connection = max_messages_per_connection
+        self.timeout = timeout
+
+        self._idle: "queue.LifoQueue[_Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.sent = 0
+        self.failed = 0
+        self.connections_opened = 0
+        self._first_send: Optional[float] = None
+        self._last_send: Optional[float] = None
+
+    def send(self, msg: EmailMessage) -> bool:
+        with self._slots:
+            conn = self._checkout()
+            try:
+                for attempt in range(2):
+                    try:
+                        if conn is None:
+                            conn = self._connect()
+                        conn.smtp.send_message(msg=msg)
+                        conn.sent += 1
+                        self._record(success=True)
+                        return True
+                    except (
+                        smtplib.SMTPServerDisconnected,
+                        ConnectionError,
+                        TimeoutError,
+                    ) as err:
+                        logger.info(f"SMTP connection lost, reconnecting. {err}")
+                        self._close(conn)
+                        conn = None
+                        if attempt:
+                            raise
+            except Exception as err:
+                logger.error(f"Failed to send email to {msg['To']}. {err}")
+                self._record(success=False)
+                return False
+            finally:
+                self._checkin(conn)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            elapsed = (
+                self._last_send - self._first_send
+                if self._first_send is not None
+                else 0.0
+            )
+            return {
+                "sent": self.sent,
+                "failed": self.failed,
+                "connections_opened": self.connections_opened,
+                "idle_connections": self._idle.qsize(),
+                "messages_per_second": self.sent / elapsed if elapsed else 0.0,
+            }
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(conn, quit=True)
+
+    def _connect(self) -> _Connection:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.starttls:
+                smtp.starttls()
+                # STARTTLS forgets the extensions, they have to be asked for again
+                smtp.ehlo()
+            if self.password:
+                smtp.login(user=self.user, password=self.password)
+        except Exception:
+            smtp.close()
+            raise
+        with self._lock:
+            self.connections_opened += 1
+        return _Connection(smtp=smtp)
+
+    def _checkout(self) -> Optional[_Connection]:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _checkin(self, conn: Optional[_Connection]) -> None:
+        if conn is None:
+            return
+        if conn.sent >= self.max_messages_per_connection:
+            self._close(conn, quit=True)
+            return
+        self._idle.put(conn)
+
+    def _close(self, conn: Optional[_Connection], quit: bool = False) -> None:
+        if conn is None:
+            return
+        try:
+            if quit:
+                conn.smtp.quit()
+            else:
+                conn.smtp.close()
+        except Exception:
+            pass
+
+    def _record(self, success: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if success:
+                self.sent += 1
+            else:
+                self.failed += 1
+            if self._first_send is None:
+                self._first_send = now
+            self._last_send = now
+
+
+@lru_cache
+def get_mailer() -> SmtpPool:
+    settings = get_settings()
+    return SmtpPool(
+        host=settings.smtp_host,
+        port=settings.smtp_port,
+        user=settings.email_from,
+        password=settings.app_password,
+        starttls=settings.smtp_starttls,
+        size=settings.smtp_pool_size,
+        max_messages_per_connection=settings.smtp_max_messages_per_connection,
+    )
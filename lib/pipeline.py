@@ -0,0 +1,181 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from lib.logger import get_logger
+
+
+logger = get_logger(name=__name__, filename="log/price_monitor.log")
+
+# Marks the end of the input for one worker of a stage
+_DONE = object()
+
+
+class StageStats:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.processed = 0
+        self.forwarded = 0
+        self.errors = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"stage {self.name}: {self.processed} items in {self.elapsed:.2f}s "
+            f"({self.throughput:.2f}/s), {self.forwarded} forwarded, {self.errors} errors"
+        )
+
+
+class Stage:
+    """
+    One step of a `Pipeline`.
+
+    ``handler`` is awaited once per item with at most ``concurrency`` items in
+    progress at a time. Whatever it returns is passed to the next stage, returning
+    `None` drops the item. The input queue of the stage holds at most ``queue_size``
+    items, so a slow stage makes the stages in front of it wait.
+
+    When ``batch_size`` is set, the handler is instead awaited with a list of up to
+    ``batch_size`` items, collected for at most ``batch_timeout`` seconds, and must
+    return the list of items to pass on.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], Awaitable[Any]],
+        concurrency: int = 1,
+        queue_size: int = 100,
+        batch_size: Optional[int] = None,
+        batch_timeout: float = 1.0,
+    ) -> None:
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+
+
+class Pipeline:
+    """
+    Staged asyncio pipeline connected by bounded queues.
+    """
+
+    def __init__(self, stages: List[Stage]) -> None:
+        self.stages = stages
+
+    async def run(self, items: Iterable[Any]) -> Dict[str, StageStats]:
+        queues = [asyncio.Queue(maxsize=s.queue_size) for s in self.stages]
+        stats = {s.name: StageStats(name=s.name) for s in self.stages}
+
+        workers = []
+        for i, stage in enumerate(self.stages):
+            next_queue = queues[i + 1] if i + 1 < len(self.stages) else None
+            next_concurrency = (
+                self.stages[i + 1].concurrency if next_queue is not None else 0
+            )
+            remaining = [stage.concurrency]
+            for _ in range(stage.concurrency):
+                workers.append(
+                    asyncio.create_task(
+                        self._work(
+                            stage=stage,
+                            stats=stats[stage.name],
+                            in_queue=queues[i],
+                            out_queue=next_queue,
+                            next_concurrency=next_concurrency,
+                            remaining=remaining,
+                        )
+                    )
+                )
+
+        for item in items:
+            await queues[0].put(item)
+        for _ in range(self.stages[0].concurrency):
+            await queues[0].put(_DONE)
+
+        await asyncio.gather(*workers)
+        for s in stats.values():
+            logger.info(str(s))
+        return stats
+
+    async def _work(
+        self,
+        stage: Stage,
+        stats: StageStats,
+        in_queue: asyncio.Queue,
+        out_queue: Optional[asyncio.Queue],
+        next_concurrency: int,
+        remaining: List[int],
+    ) -> None:
+        done = False
+        while not done:
+            if stage.batch_size:
+                batch, done = await self._next_batch(stage=stage, in_queue=in_queue)
+            else:
+                item = await in_queue.get()
+                batch, done = ([], True) if item is _DONE else ([item], False)
+            if not batch:
+                continue
+
+            if stats.started_at is None:
+                stats.started_at = time.monotonic()
+            try:
+                if stage.batch_size:
+                    results = await stage.handler(batch) or []
+                else:
+                    results = [await stage.handler(batch[0])]
+            except Exception as err:
+                stats.errors += 1
+                logger.error(f"Stage {stage.name} failed on {batch}. {err}")
+                results = []
+            stats.processed += len(batch)
+            stats.finished_at = time.monotonic()
+            if out_queue is not None:
+                for result in results:
+                    if result is None:
+                        continue
+                    stats.forwarded += 1
+                    await out_queue.put(result)
+
+        # The last worker of a stage to finish tells the next stage there is no more input
+        remaining[0] -= 1
+        if remaining[0] == 0 and out_queue is not None:
+            for _ in range(next_concurrency):
+                await out_queue.put(_DONE)
+
+    async def _next_batch(self, stage: Stage, in_queue: asyncio.Queue) -> tuple:
+        """
+        Collect up to `stage.batch_size` items. Returns the items and whether the end
+        of the input was reached.
+        """
+        batch = []
+        deadline = None
+        while len(batch) < stage.batch_size:
+            if deadline is None:
+                item = await in_queue.get()
+                deadline = time.monotonic() + stage.batch_timeout
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(in_queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
@@ -0,0 +1,244 @@
+import heapq
+import itertools
+import math
+import time
+from typing import Dict, List, Optional
+
+
+class TokenBucket:
+    """
+    Rate budget of ``rate_per_hour`` operations, allowing bursts of ``capacity``.
+    """
+
+    def __init__(self, rate_per_hour: float, capacity: Optional[float] = None):
+        self.rate_per_hour = rate_per_hour
+        self.rate = rate_per_hour / 3600
+        self.capacity = capacity or max(1.0, rate_per_hour / 12)
+        self.tokens = self.capacity
+        self.updated = time.time()
+
+    def set_rate(self, rate_per_hour: float) -> None:
+        self._refill(time.time())
+        self.rate = rate_per_hour / 3600
+        self.capacity = max(1.0, rate_per_hour / 12)
+        self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now: float) -> float:
+        self._refill(now)
+        if self.tokens >= 1 or not self.rate:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+def known_price(price: Optional[float]) -> Optional[float]:
+    """
+    `price` as a float, or `None` for a missing price or the scraper's negative
+    "price unavailable" marker.
+    """
+    if price is None:
+        return None
+    price = float(price)
+    return price if price >= 0 else None
+
+
+class ProductState:
+    __slots__ = (
+        "link_id",
+        "vendor",
+        "subscribers",
+        "price",
+        "volatility",
+        "last_change",
+        "next_check",
+        "in_flight",
+    )
+
+    def __init__(
+        self, link_id: str, vendor: int, subscribers: int, price: Optional[float]
+    ):
+        self.link_id = link_id
+        self.vendor = vendor
+        self.subscribers = subscribers
+        self.price = known_price(price)
+        # Exponentially weighted average of the relative price change per check
+        self.volatility = 0.0
+        self.last_change: Optional[float] = None
+        self.next_check: Optional[float] = None
+        self.in_flight = False
+
+
+class CheckScheduler:
+    """
+    Decide when each product should be checked next.
+
+    Products live in a min-heap ordered by their next check time. The interval
+    between two checks of a product starts at ``base_interval`` and shrinks for
+    products whose price moves a lot, that many users watch or whose price changed
+    recently. It always stays within [``min_interval``, ``max_interval``]. On top
+    of that each vendor has an hourly budget of checks. Due products over the budget
+    are pushed back until the vendor has capacity again.
+    """
+
+    VOLATILITY_DECAY = 0.3
+
+    def __init__(
+        self,
+        base_interval: float = 3600,
+        min_interval: float = 900,
+        max_interval: float = 86400,
+        vendor_budgets: Optional[Dict[int, float]] = None,
+    ) -> None:
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.buckets = {
+            vendor: TokenBucket(rate_per_hour=budget)
+            for vendor, budget in (vendor_budgets or {}).items()
+        }
+        self.states: Dict[str, ProductState] = {}
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def upsert(
+        self, link_id: str, vendor: int, subscribers: int, price: Optional[float]
+    ) -> None:
+        """
+        Add a product, or refresh what we know about it. New products are due
+        immediately.
+        """
+        state = self.states.get(link_id)
+        if state is None:
+            state = ProductState(
+                link_id=link_id, vendor=vendor, subscribers=subscribers, price=price
+            )
+            self.states[link_id] = state
+        state.subscribers = subscribers
+        state.vendor = vendor
+        if state.next_check is None and not state.in_flight:
+            self._push(state, when=time.time())
+
+    def share_budgets(self, share: float) -> None:
+        """
+        Only use `share` of every vendor budget, e.g. when several workers split it.
+        """
+        for bucket in self.buckets.values():
+            bucket.set_rate(bucket.rate_per_hour * share)
+
+    def next_check_of(self, link_id: str) -> float:
+        """
+        When `link_id` is due, in-flight products count as due now and unknown
+        products as never.
+        """
+        state = self.states.get(link_id)
+        if state is None:
+            return float("inf")
+        return state.next_check or 0.0
+
+    def remove(self, link_id: str) -> None:
+        # The heap entry is skipped once popped
+        self.states.pop(link_id, None)
+
+    def record(self, link_id: str, new_price: Optional[float]) -> None:
+        """
+        Record the outcome of a check and schedule the next one. `None` or a negative
+        price means the price could not be read, which reschedules without touching
+        the statistics.
+        """
+        state = self.states.get(link_id)
+        if state is None:
+            return
+        state.in_flight = False
+        now = time.time()
+        new_price = known_price(new_price)
+        if new_price is not None and not state.price:
+            # Nothing to compare with, start the statistics from this price
+            state.price = new_price
+        elif new_price is not None:
+            change = abs(new_price - state.price) / state.price
+            state.volatility = (
+                self.VOLATILITY_DECAY * change
+                + (1 - self.VOLATILITY_DECAY) * state.volatility
+            )
+            if new_price != state.price:
+                state.last_change = now
+                state.price = new_price
+        self._push(state, when=now + self.interval(state, now=now))
+
+    def interval(self, state: ProductState, now: float) -> float:
+        # A 1% average move per check roughly doubles the check frequency
+        volatility_factor = 1 + 100 * state.volatility
+        subscriber_factor = 1 + math.log1p(state.subscribers)
+        recency_factor = 1.0
+        if state.last_change is not None:
+            days_since_change = (now - state.last_change) / 86400
+            recency_factor = 1 + 1 / (1 + days_since_change)
+        interval = self.base_interval / (
+            volatility_factor * subscriber_factor * recency_factor
+        )
+        # Products nobody watches any more are checked as rarely as allowed
+        if state.subscribers == 0:
+            interval = self.max_interval
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def pop_due(self, limit: int, now: Optional[float] = None) -> List[str]:
+        """
+        Return up to `limit` link ids whose check is due and whose vendor has budget
+        left. Returned products are not rescheduled until `record` is called.
+        """
+        now = now or time.time()
+        due = []
+        deferred = []
+        while self._heap and len(due) < limit:
+            when, _, link_id = self._heap[0]
+            if when > now:
+                break
+            heapq.heappop(self._heap)
+            state = self.states.get(link_id)
+            if state is None or state.next_check != when:
+                continue  # Removed or rescheduled since this entry was pushed
+
+            bucket = self.buckets.get(state.vendor)
+            if bucket is not None and not bucket.take(now):
+                deferred.append((state, now + bucket.wait_time(now)))
+                continue
+            state.next_check = None
+            state.in_flight = True
+            due.append(link_id)
+
+        for state, when in deferred:
+            self._push(state, when=when)
+        return due
+
+    def in_flight(self, link_ids: List[str]) -> List[str]:
+        return [
+            link_id
+            for link_id in link_ids
+            if link_id in self.states and self.states[link_id].in_flight
+        ]
+
+    def next_due(self) -> Optional[float]:
+        while self._heap:
+            when, _, link_id = self._heap[0]
+            state = self.states.get(link_id)
+            if state is not None and state.next_check == when:
+                return when
+            heapq.heappop(self._heap)
+        return None
+
+    def _push(self, state: ProductState, when: float) -> None:
+        state.next_check = when
+        heapq.heappush(self._heap, (when, next(self._seq), state.link_id))
@@ -1,8 +1,11 @@
-from pydantic import BaseModel
+import datetime
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Literal
 from enum import Enum
 
 VendorType = Literal["amazon", "bestbuy", "ebay"]
+HistoryResolution = Literal["hour", "day"]
+AlertMode = Literal["instant", "digest"]
 
 
 class SuccessResp(BaseModel):
@@ -33,6 +36,7 @@ class User(BaseModel):
     email: str
     first_name: Optional[str] = None
     last_name: Optional[str] = None
+    alert_mode: AlertMode = "instant"
 
     class Config:
         from_attributes = True
@@ -43,6 +47,10 @@ class UserUpdateReq(BaseModel):
     last_name: str
 
 
+class AlertModeReq(BaseModel):
+    alert_mode: AlertMode
+
+
 class TokenResp(BaseModel):
     token: str
     new: bool
@@ -56,10 +64,45 @@ class Product(BaseModel):
     img_src: str
     price: float
 
+    class Config:
+        from_attributes = True
+
+
+class ProductPage(BaseModel):
+    products: List[Product]
+    # Pass as `cursor` to get the next page, `None` on the last page
+    next_cursor: Optional[str] = None
+
+
+class PricePoint(BaseModel):
+    period_start: datetime.datetime
+    min_price: float
+    max_price: float
+    last_price: float
+    samples: int
+
+    class Config:
+        from_attributes = True
+
+
+class PriceHistory(BaseModel):
+    link_id: str
+    resolution: HistoryResolution
+    points: List[PricePoint]
+
 
 class Subscription(BaseModel):
     user_id: str
     link_id: str
+    target_price: Optional[float] = None
+    min_drop_percent: Optional[float] = None
+
+
+class AlertThresholdReq(BaseModel):
+    # Alert only when the price is at or below this
+    target_price: Optional[float] = Field(default=None, ge=0)
+    # Alert only when the price dropped by at least this many percent at once
+    min_drop_percent: Optional[float] = Field(default=None, ge=0, le=100)
 
 
 class Vendor(Enum):
@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from typing import List, Optional
+
+from sqlalchemy.engine import Row
+
+from db import crud
+from db.base import SyncSessionLocal, create_schema_sync
+from lib import schemas
+from config import get_settings
+from lib.utils import get_logger
+from lib.mailer import get_mailer
+
+
+class NotificationDispatcher:
+    """
+    Drain the notification outbox written by the price monitor.
+
+    Due rows are claimed in batches and sent concurrently through the pooled SMTP
+    connections, one email per row for users in instant mode and one email per
+    user for the rows of users in digest mode. A failed send is retried with an
+    exponentially growing delay and dead-lettered after ``dispatcher_max_attempts``
+    attempts. Delivery is at least once, a dispatcher that dies after sending but
+    before reporting back sends the same rows again. Every email carries a
+    Message-ID derived from its outbox row, so mail clients can drop such
+    duplicates.
+    """
+
+    def __init__(self) -> None:
+        self.settings = get_settings()
+        self.logger = get_logger(
+            name="notification_dispatcher", filename="log/notification_dispatcher.log"
+        )
+
+    def run(self) -> None:
+        with ThreadPoolExecutor(
+            max_workers=self.settings.dispatcher_concurrency + 1
+        ) as executor:
+            asyncio.run(self._run(executor))
+
+    async def _run(self, executor: ThreadPoolExecutor) -> None:
+        asyncio.get_running_loop().set_default_executor(executor)
+        while True:
+            if not await self.dispatch_once():
+                await asyncio.sleep(self.settings.dispatcher_poll_interval)
+
+    async def dispatch_once(self) -> int:
+        """
+        Claim and send one batch. Returns the number of claimed rows.
+        """
+        rows = await asyncio.to_thread(self.claim)
+        if not rows:
+            return 0
+        semaphore = asyncio.Semaphore(self.settings.dispatcher_concurrency)
+
+        async def send(group: List[Row]) -> Optional[str]:
+            async with semaphore:
+                return await asyncio.to_thread(self.send, group)
+
+        groups = self.group(rows)
+        errors = await asyncio.gather(*(send(group) for group in groups))
+        # Every row of an email shares its outcome
+        await asyncio.to_thread(
+            self.finish,
+            [row for group in groups for row in group],
+            [error for group, error in zip(groups, errors) for _ in group],
+        )
+        self.logger.info(f"Mailer stats: {get_mailer().stats()}")
+        return len(rows)
+
+    def claim(self) -> List[Row]:
+        db = SyncSessionLocal()
+        try:
+            return crud.claim_notifications(
+                db=db,
+                limit=self.settings.dispatcher_batch_size,
+                lease_seconds=self.settings.dispatcher_lease_seconds,
+                digest_window=self.settings.dispatcher_digest_window,
+                max_attempts=self.settings.dispatcher_max_attempts,
+            )
+        finally:
+            db.close()
+
+    def group(self, rows: List[Row]) -> List[List[Row]]:
+        """
+        Split claimed rows into the rows of each email to send.
+        """
+        groups = []
+        digests = {}
+        for row in rows:
+            if row.alert_mode == "digest" and row.link is not None:
+                digests.setdefault(row.user_id, []).append(row)
+            else:
+                groups.append([row])
+        return groups + list(digests.values())
+
+    def send(self, rows: List[Row]) -> Optional[str]:
+        """
+        Send one email for `rows`. Returns `None` on success, else the error.
+        """
+        row = rows[0]
+        if row.email is None:
+            return "subscriber no longer exists"
+        if row.link is None:
+            return "product no longer exists"
+        self.logger.info(
+            f"Sending price update email for {len(rows)} products to {row.email}"
+        )
+        if not get_mailer().send(msg=self.build_message(rows)):
+            return "SMTP send failed"
+        return None
+
+    def build_message(self, rows: List[Row]) -> EmailMessage:
+        msg = EmailMessage()
+        if len(rows) == 1:
+            row = rows[0]
+            vendor = schemas.Vendor(row.vendor).name.lower()
+            msg.set_content(
+                f"Great news! We have a lower price of ${row.price} for your {vendor} product {row.title}. Here is your link! {row.link}"
+            )
+            msg["Subject"] = "Hurry up! We got a better deal for your product!"
+        else:
+            lines = [
+                f"- ${row.price} for your {schemas.Vendor(row.vendor).name.lower()} product {row.title}. {row.link}"
+                for row in rows
+            ]
+            msg.set_content(
+                "Great news! We have lower prices for some of your products. Here are your links!\n\n"
+                + "\n".join(lines)
+            )
+            msg["Subject"] = (
+                f"Hurry up! We got better deals for {len(rows)} of your products!"
+            )
+
+        msg["From"] = self.settings.email_from
+        msg["To"] = rows[0].email
+        # Stable across retries of the same rows
+        msg["Message-ID"] = (
+            f"<{rows[0].event_id[:32]}.{rows[0].id}.{len(rows)}@price-sentry>"
+        )
+        return msg
+
+    def finish(self, rows: List[Row], errors: List[Optional[str]]) -> None:
+        now = datetime.datetime.utcnow()
+        sent_ids = []
+        failed = {}
+        retry_at = {}
+        for row, error in zip(rows, errors):
+            if error is None:
+                sent_ids.append(row.id)
+                continue
+            self.logger.error(
+                f"Failed to notify {row.email} of product {row.link_id}, attempt {row.attempts}. {error}"
+            )
+            failed[row.id] = error
+            # Nothing to retry when the subscriber or the product is gone
+            retryable = row.email is not None and row.link is not None
+            if retryable and row.attempts < self.settings.dispatcher_max_attempts:
+                delay = self.settings.dispatcher_retry_delay * 2 ** (row.attempts - 1)
+                retry_at[row.id] = now + datetime.timedelta(seconds=delay)
+
+        db = SyncSessionLocal()
+        try:
+            crud.finish_notifications(
+                db=db, sent_ids=sent_ids, failed=failed, retry_at=retry_at
+            )
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Send one batch of due notifications and exit",
+    )
+    args = parser.parse_args()
+
+    create_schema_sync()
+    dispatcher = NotificationDispatcher()
+    if args.once:
+        asyncio.run(dispatcher.dispatch_once())
+    else:
+        dispatcher.run()
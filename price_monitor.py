@@ -1,124 +1,453 @@
-from email.message import EmailMessage
-import smtplib
-import schedule
-from typing import List
+import argparse
+import asyncio
+import datetime
+import hashlib
+import math
+import multiprocessing
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
 import time
 
 from scraper.amazon.amazon_search import amazon_track_price
-from db import models
-from db.base import SyncSessionLocal
+from db import crud
+from db.base import SyncSessionLocal, create_schema_sync, get_pool_stats
 from lib import schemas
 from config import get_settings
 from lib.utils import get_logger
+from lib.alerts import PriceDrop
+from lib.pipeline import Pipeline, Stage
+from lib.scheduler import CheckScheduler
+
+
+class ProductRecord:
+    """
+    The few columns of a product the monitor needs between checks. Much smaller than
+    an ORM object and not tied to any session.
+    """
+
+    __slots__ = ("link_id", "vendor", "link", "title", "price")
+
+    def __init__(
+        self, link_id: str, vendor: int, link: str, title: str, price: float
+    ) -> None:
+        self.link_id = link_id
+        self.vendor = vendor
+        self.link = link
+        self.title = title
+        # Stored as a float so it compares cleanly with scraped prices
+        self.price = float(price) if price is not None else None
+
+
+class PriceCheck(NamedTuple):
+    product: ProductRecord
+    new_price: float
+    checked_at: datetime.datetime
 
 
 class PriceMonitor:
-    def __init__(self) -> None:
+    def __init__(self, worker_id: Optional[str] = None) -> None:
+        """
+        With a `worker_id` the monitor runs as one of several workers sharing the
+        product table. It only checks the products it holds a lease on.
+        """
         self.settings = get_settings()
         self.logger = get_logger(name="price_monitor", filename="log/price_monitor.log")
-        self.db = SyncSessionLocal()
-        self.products = []
+        self.products: Dict[str, ProductRecord] = {}
+        self.worker_id = worker_id
+        self.owned: Set[str] = set()
+        self._owned_lock = threading.Lock()
+        self.scheduler = CheckScheduler(
+            base_interval=self.settings.monitor_base_interval,
+            min_interval=self.settings.monitor_min_interval,
+            max_interval=self.settings.monitor_max_interval,
+            vendor_budgets={
+                schemas.Vendor[vendor.upper()].value: budget
+                for vendor, budget in self.settings.monitor_vendor_budgets.items()
+            },
+        )
 
     def get_all_products(self) -> None:
         self.logger.info("Getting all products in the database")
-        products = self.db.query(models.Product).all()
+        link_ids = None
+        if self.worker_id is not None:
+            link_ids = sorted(self.rebalance_shard())
+
+        products = {}
+        for chunk, subscribers in self.iter_product_chunks(link_ids=link_ids):
+            for p in chunk:
+                products[p.link_id] = p
+                self.scheduler.upsert(
+                    link_id=p.link_id,
+                    vendor=p.vendor,
+                    subscribers=subscribers.get(p.link_id, 0),
+                    price=p.price,
+                )
+        for link_id in list(self.scheduler.states):
+            if link_id not in products:
+                self.scheduler.remove(link_id)
         self.products = products
 
-    def check_price(self) -> None:
-        for p in self.products:
-            should_send_email = False
-            if schemas.Vendor(p.vendor) == schemas.Vendor.AMAZON:
-                # new_price = amazon_track_price(p.link)
-                new_price = (
-                    p.price - 1
-                )  # This is only for testing purposes, pretending that the price dropped
-
-            # TODO OTHER VENDORS
-
-            if new_price != p.price:
-                if new_price < p.price:
-                    should_send_email = True
-                # Update our db
-                product_query = self.db.query(models.Product).filter(
-                    models.Product.link_id == p.link_id
+    def iter_product_chunks(
+        self, link_ids: Optional[List[str]] = None
+    ) -> Iterator[Tuple[List[ProductRecord], Dict[str, int]]]:
+        """
+        Stream the products, or only `link_ids`, in chunks together with their
+        subscriber counts. Every chunk is read in a fresh session that is closed
+        before the chunk is handed out, so no ORM state outlives a chunk.
+        """
+        chunk_size = self.settings.monitor_load_chunk_size
+        after = None
+        offset = 0
+        while True:
+            db = SyncSessionLocal()
+            try:
+                if link_ids is None:
+                    rows = crud.get_product_rows(db=db, limit=chunk_size, after=after)
+                else:
+                    chunk_ids = link_ids[offset : offset + chunk_size]
+                    offset += chunk_size
+                    rows = (
+                        crud.get_product_rows(
+                            db=db, limit=chunk_size, link_ids=chunk_ids
+                        )
+                        if chunk_ids
+                        else []
+                    )
+                chunk = [
+                    ProductRecord(
+                        link_id=r.link_id,
+                        vendor=r.vendor,
+                        link=r.link,
+                        title=r.title,
+                        price=r.price,
+                    )
+                    for r in rows
+                ]
+                subscribers = (
+                    crud.count_subscribers(
+                        db=db, link_ids=[p.link_id for p in chunk]
+                    )
+                    if chunk
+                    else {}
                 )
-                product = product_query.first()
-                if not product:
-                    self.logger.error(f"Product with link id {p.link_id} not found")
+            finally:
+                db.close()
+
+            if chunk:
+                yield chunk, subscribers
+            if link_ids is None:
+                if len(chunk) < chunk_size:
                     return
+                after = chunk[-1].link_id
+            elif offset >= len(link_ids):
+                return
+
+    def rebalance_shard(self) -> Set[str]:
+        """
+        Bring the number of leased products close to an equal share of the catalog
+        among the live workers, claiming free products or releasing surplus ones.
+        """
+        lease_seconds = self.settings.monitor_lease_seconds
+        db = SyncSessionLocal()
+        try:
+            owned = crud.renew_leases(
+                db=db, owner=self.worker_id, lease_seconds=lease_seconds
+            )
+            total, workers = crud.count_workers(db=db, lease_seconds=lease_seconds)
+            target = math.ceil(total / max(1, workers))
+            # The vendor budgets are global, each worker gets its share
+            self.scheduler.share_budgets(1 / max(1, workers))
 
-                product_query.update({"price": new_price})
-                self.db.commit()
-
-            if should_send_email:
-                emails = self.get_emails_by_product(p.link_id)
-                self.logger.info(f"Sending email to user xxx")
-                for email_to in emails:
-                    self.send_email(
-                        email_to=email_to,
-                        vendor="amazon",
-                        new_price=new_price,
-                        product=p,
+            if len(owned) > target:
+                # Give back the products whose next check is the furthest away
+                surplus = sorted(owned, key=self.scheduler.next_check_of)[target:]
+                crud.release_leases(db=db, owner=self.worker_id, link_ids=surplus)
+                owned -= set(surplus)
+            elif len(owned) < target:
+                owned |= set(
+                    crud.claim_products(
+                        db=db,
+                        owner=self.worker_id,
+                        limit=target - len(owned),
+                        lease_seconds=lease_seconds,
                     )
+                )
+        finally:
+            db.close()
 
-    def get_emails_by_product(self, link_id: str) -> List[str]:
-        emails = []
-        # first go through the subscription table to grap all the user id
-        user_id_ls = []
-        self.logger.info(f"Getting all subscriptions for the link id {link_id}")
-        subscriptions = (
-            self.db.query(models.Subscription)
-            .filter(models.Subscription.link_id == link_id)
-            .all()
+        self.logger.info(
+            f"Worker {self.worker_id} holds {len(owned)} of {total} products, {workers} workers"
         )
-        if not subscriptions:
-            self.logger.error(f"Failed to get subscriptions by link id {link_id}")
-            return []
-        for s in subscriptions:
-            user_id_ls.append(s.user_id)
-        for user_id in user_id_ls:
-            self.logger.info(f"Getting user email by user id {user_id}")
-            user = self.db.query(models.User).filter(models.User.id == user_id).first()
-            if not user:
-                self.logger.error(f"Failed to get user email by user id {user_id}")
-            emails.append(user.email)
-        return emails
-
-    def send_email(
+        with self._owned_lock:
+            self.owned = owned
+        return owned
+
+    def heartbeat(self) -> None:
+        """
+        Renew our leases well before they expire, even while a long check runs.
+        """
+        while True:
+            time.sleep(self.settings.monitor_lease_seconds / 3)
+            db = SyncSessionLocal()
+            try:
+                owned = crud.renew_leases(
+                    db=db,
+                    owner=self.worker_id,
+                    lease_seconds=self.settings.monitor_lease_seconds,
+                )
+            finally:
+                db.close()
+            with self._owned_lock:
+                lost = self.owned - owned
+                self.owned = owned
+            if lost:
+                self.logger.error(
+                    f"Worker {self.worker_id} lost the lease of {len(lost)} products"
+                )
+
+    def run(self) -> None:
+        """
+        Check products forever, each one when the scheduler says it is due.
+        """
+        if self.worker_id is not None:
+            threading.Thread(target=self.heartbeat, daemon=True).start()
+
+        next_refresh = 0.0
+        next_prune = 0.0
+        while True:
+            if time.time() >= next_refresh:
+                self.get_all_products()
+                next_refresh = time.time() + self.settings.monitor_refresh_interval
+            if time.time() >= next_prune:
+                self.prune_history()
+                next_prune = time.time() + self.settings.history_prune_interval
+
+            due = self.scheduler.pop_due(limit=self.settings.monitor_max_batch)
+            if self.worker_id is not None:
+                # Skip products another worker took over since the last refresh
+                with self._owned_lock:
+                    lost = [l for l in due if l not in self.owned]
+                for link_id in lost:
+                    self.scheduler.remove(link_id)
+                due = [l for l in due if l not in lost]
+            if due:
+                self.check_price(products=[self.products[l] for l in due])
+                # Products whose check crashed still need a next check
+                for link_id in self.scheduler.in_flight(due):
+                    self.scheduler.record(link_id, new_price=None)
+                continue
+
+            next_due = self.scheduler.next_due() or next_refresh
+            time.sleep(max(1.0, min(next_due, next_refresh) - time.time()))
+
+    def check_price(self, products: Optional[List[ProductRecord]] = None) -> None:
+        """
+        Run one sweep over `products`, or all of `self.products`.
+
+        Every product goes through four stages connected by bounded queues: fetch the
+        current price, record it in the price history, diff it against the stored
+        one and persist changed prices in chunks. Each stage has its own concurrency
+        limit. Price drops are queued in the notification outbox together with the
+        new price and emailed by the notification dispatcher, so slow mail never
+        holds up the checks.
+        """
+        products = list(self.products.values()) if products is None else products
+        self.logger.info(f"Checking the price of {len(products)} products")
+        pipeline = Pipeline(
+            stages=[
+                Stage(
+                    name="fetch",
+                    handler=self.fetch_price,
+                    concurrency=self.settings.monitor_fetch_concurrency,
+                    queue_size=self.settings.monitor_queue_size,
+                ),
+                Stage(
+                    name="record",
+                    handler=self.record_prices,
+                    queue_size=self.settings.monitor_queue_size,
+                    batch_size=self.settings.history_batch_size,
+                    batch_timeout=self.settings.history_batch_timeout,
+                ),
+                Stage(
+                    name="diff",
+                    handler=self.diff_price,
+                    queue_size=self.settings.monitor_queue_size,
+                ),
+                Stage(
+                    name="persist",
+                    handler=self.persist_price,
+                    concurrency=self.settings.monitor_persist_concurrency,
+                    queue_size=self.settings.monitor_queue_size,
+                    batch_size=self.settings.monitor_persist_chunk_size,
+                    batch_timeout=self.settings.monitor_persist_batch_timeout,
+                ),
+            ]
+        )
+        # Blocking work (scraping, DB) runs in threads, make sure there are
+        # enough of them for every stage to reach its concurrency limit
+        max_workers = (
+            1
+            + self.settings.monitor_fetch_concurrency
+            + self.settings.monitor_persist_concurrency
+        )
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            asyncio.run(self._run_pipeline(pipeline, executor, products))
+        self.logger.info(f"DB pool stats: {get_pool_stats()['sync']}")
+
+    async def _run_pipeline(
         self,
-        email_to: str,
-        vendor: str,
-        new_price: str,
-        product: schemas.Product,
+        pipeline: Pipeline,
+        executor: ThreadPoolExecutor,
+        products: List[ProductRecord],
     ) -> None:
+        asyncio.get_running_loop().set_default_executor(executor)
+        await pipeline.run(products)
+
+    async def fetch_price(self, p: ProductRecord) -> Optional[PriceCheck]:
+        new_price = None
+        if schemas.Vendor(p.vendor) == schemas.Vendor.AMAZON:
+            new_price = await asyncio.to_thread(amazon_track_price, p.link)
+
+        # TODO OTHER VENDORS
+
+        self.scheduler.record(p.link_id, new_price=new_price)
+        if new_price is None:
+            self.logger.error(f"Failed to get the price of product {p.link_id}")
+            return None
+        return PriceCheck(
+            product=p, new_price=new_price, checked_at=datetime.datetime.utcnow()
+        )
+
+    async def record_prices(self, checks: List[PriceCheck]) -> List[PriceCheck]:
+        observations = [
+            (c.product.link_id, c.checked_at, c.new_price) for c in checks
+        ]
+        await asyncio.to_thread(self.add_observations, observations)
+        # A failed history write must not hold back price updates and emails
+        return checks
+
+    async def diff_price(self, check: PriceCheck) -> Optional[PriceCheck]:
+        if check.new_price == check.product.price:
+            return None
+        return check
+
+    async def persist_price(self, checks: List[PriceCheck]) -> None:
+        prices = {c.product.link_id: c.new_price for c in checks}
+        # Only price drops can be worth an email, the subscribers' thresholds decide
+        drops = {
+            c.product.link_id: PriceDrop(
+                event_id=self.drop_id(c), old_price=c.product.price
+            )
+            for c in checks
+            if c.product.price is not None and c.new_price < c.product.price
+        }
+        updated = await asyncio.to_thread(self.update_prices, prices, drops)
+        # Keep the in-memory snapshot in line with the database for the next diff
+        for c in checks:
+            if c.product.link_id in updated:
+                c.product.price = c.new_price
+
+    @staticmethod
+    def drop_id(check: PriceCheck) -> str:
+        """
+        Id of a price drop, the same check always gets the same id.
+        """
+        key = f"{check.product.link_id}|{check.new_price}|{check.checked_at.isoformat()}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def update_prices(
+        self, prices: Dict[str, float], drops: Dict[str, PriceDrop]
+    ) -> Set[str]:
+        db = SyncSessionLocal()
         try:
-            self.logger.info(f"Sending price update email to {email_to}")
-            msg = EmailMessage()
-            msg.set_content(
-                f"Great news! We have a lower price of ${new_price} for your {vendor} product {product.title}. Here is your link! {product.link}"
+            return crud.update_product_prices(
+                db=db,
+                prices=prices,
+                chunk_size=self.settings.monitor_persist_chunk_size,
+                drops=drops,
             )
+        finally:
+            db.close()
 
-            msg["Subject"] = "Hurry up! We got a better deal for your product!"
-            msg["From"] = self.settings.email_from
-            msg["To"] = email_to
+    def add_observations(
+        self, observations: List[Tuple[str, datetime.datetime, float]]
+    ) -> None:
+        db = SyncSessionLocal()
+        try:
+            crud.add_price_observations(db=db, observations=observations)
+        finally:
+            db.close()
 
-            # Connect to Gmail's SMTP server
-            connection = smtplib.SMTP("smtp.gmail.com", 587)
-            connection.starttls()
-            connection.login(
-                user=self.settings.email_from, password=self.settings.app_password
+    def prune_history(self) -> None:
+        """
+        Downsample the price history, see `crud.prune_price_history`.
+        """
+        now = datetime.datetime.utcnow()
+        db = SyncSessionLocal()
+        try:
+            crud.prune_price_history(
+                db=db,
+                raw_before=now
+                - datetime.timedelta(days=self.settings.history_raw_retention_days),
+                hourly_before=now
+                - datetime.timedelta(days=self.settings.history_hourly_retention_days),
             )
-            connection.send_message(msg=msg)
-            connection.quit()
-        except Exception as err:
-            self.logger.error(f"Failed to send price update email to {email_to}. {err}")
+        finally:
+            db.close()
+
+
+def run_worker(worker_id: Optional[str] = None) -> None:
+    price_monitor = PriceMonitor(worker_id=worker_id)
+    try:
+        price_monitor.run()
+    finally:
+        if worker_id is not None:
+            db = SyncSessionLocal()
+            try:
+                crud.release_leases(db=db, owner=worker_id)
+            finally:
+                db.close()
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()[:30]}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def run_local_worker() -> None:
+    run_worker(worker_id=new_worker_id())
 
 
 if __name__ == "__main__":
-    price_monitor = PriceMonitor()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="Share the products with other workers through leases in the database",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of local worker processes to start, implies --worker",
+    )
+    args = parser.parse_args()
 
-    schedule.every().hour.do(price_monitor.get_all_products)
-    schedule.every().hour.do(price_monitor.check_price)
-    while True:
-        schedule.run_pending()
-        time.sleep(100)
+    # Migrate once here rather than in every worker process
+    create_schema_sync()
+    if args.workers > 1:
+        processes = [
+            multiprocessing.Process(target=run_local_worker)
+            for _ in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    elif args.worker:
+        run_worker(worker_id=new_worker_id())
+    else:
+        run_worker()
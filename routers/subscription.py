@@ -1,5 +1,6 @@
+import datetime
 from fastapi import APIRouter
-from fastapi import Depends
+from fastapi import Depends, Query
 from typing import Annotated, Union, Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -61,21 +62,29 @@ def search(
 
 # Get all the products that the user subscribes to
 @router.get("/products")
-async def get_products(user_id: UserAuthDep, sub_service: SubServiceDep):
+async def get_products(
+    user_id: UserAuthDep,
+    sub_service: SubServiceDep,
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+) -> schemas.ProductPage:
     """
-    Retrieve a list of products associated with the authenticated user.
+    Retrieve a page of the products associated with the authenticated user.
 
-    This endpoint retrieves all products that the authenticated user is subscribed to. It uses the `SubService`
-    to fetch the list of products based on the user's subscriptions.
+    This endpoint retrieves the products that the authenticated user is subscribed to, ordered by link id, one
+    page at a time. It uses the `SubService` to fetch the products with a single query.
 
     Args:
         user_id (UserAuthDep): The authenticated user's ID, provided by a dependency that manages user
             authentication.
         sub_service (SubServiceDep): Dependency injection for the service that retrieves the user's products.
+        limit (int, optional): The maximum number of products on the page, between 1 and 200. Default is 50.
+        cursor (str, optional): The `next_cursor` of the previous page. Omit it to get the first page.
 
     Returns:
-        List[schemas.Product]:
-            - A list of `schemas.Product` objects representing the products associated with the user's subscriptions.
+        schemas.ProductPage:
+            - `products`: The `schemas.Product` objects on this page.
+            - `next_cursor`: The cursor of the next page, or `None` if this is the last page.
 
     Raises:
         HTTPException: Raises an HTTP 404 Not Found error if no products are found for the user.
@@ -84,7 +93,7 @@ async def get_products(user_id: UserAuthDep, sub_service: SubServiceDep):
         - Ensure that the user is authenticated and authorized to access the product data.
         - This endpoint assumes that the `user_id` corresponds to an existing user with associated subscriptions.
     """
-    return await sub_service.get_products(user_id=user_id)
+    return await sub_service.get_products(user_id=user_id, limit=limit, cursor=cursor)
 
 
 @router.post("/product")
@@ -112,16 +121,116 @@ async def subscribe(
         HTTPException: May raise an HTTP 400 Bad Request if there are issues with the subscription request.
 
     Notes:
-        - The method first checks if the subscription already exists. If it does, it returns a failure response.
-        - If the subscription does not exist, it creates a new subscription and checks if the product exists in
-          the database. If not, it creates a new product entry.
+        - The product is created if it is not in the database yet, and the subscription is created in the same
+          transaction. If the subscription already exists, it returns a failure response.
         - The product's details should include a valid `link_id` for subscription management.
     """
     return await sub_service.subscribe(user_id=user_id, product=product)
 
 
+@router.post("/products")
+async def subscribe_many(
+    user_id: UserAuthDep, products: List[schemas.Product], sub_service: SubServiceDep
+) -> Union[schemas.SuccessResp, schemas.FailureResp]:
+    """
+    Subscribe the authenticated user to many products at once.
+
+    This endpoint is the bulk variant of `POST /sub/product`, e.g. to import a watch list. All the products and
+    subscriptions are created in one transaction, so either all of them are subscribed to or none.
+
+    Args:
+        user_id (UserAuthDep): The ID of the authenticated user making the subscription request.
+        products (List[schemas.Product]): The products that the user wants to subscribe to, at most
+            `subscribe_max_products` of them.
+        sub_service (SubServiceDep): Dependency injection for the service handling subscription logic.
+
+    Returns:
+        Union[schemas.SuccessResp, schemas.FailureResp]:
+            - `schemas.SuccessResp`: The products were subscribed to, with the number of new subscriptions.
+              Products the user already subscribed to are skipped.
+            - `schemas.FailureResp`: There are too many products or the transaction failed.
+    """
+    return await sub_service.subscribe_many(user_id=user_id, products=products)
+
+
 @router.delete("/product/{link_id}")
 async def unsubscribe(
     user_id: UserAuthDep, link_id: str, sub_service: SubServiceDep
 ) -> Union[schemas.SuccessResp, schemas.FailureResp]:
     return await sub_service.unsubscribe(user_id=user_id, link_id=link_id)
+
+
+@router.put("/product/{link_id}/alert")
+async def update_alert_threshold(
+    user_id: UserAuthDep,
+    link_id: str,
+    threshold: schemas.AlertThresholdReq,
+    sub_service: SubServiceDep,
+) -> Union[schemas.SuccessResp, schemas.FailureResp]:
+    """
+    Set when the authenticated user is alerted about price drops of a subscribed product.
+
+    Without thresholds every price drop is an alert. With a `target_price` only drops to that price or below
+    are, with a `min_drop_percent` only drops of at least that many percent of the previous price. When both are
+    set a drop has to meet both. Sending a threshold as `null` removes it.
+
+    Args:
+        user_id (UserAuthDep): The ID of the authenticated user.
+        link_id (str): The unique identifier of the subscribed product.
+        threshold (schemas.AlertThresholdReq): The new thresholds. A negative `target_price` or a
+            `min_drop_percent` outside 0-100 is rejected with 422 Unprocessable Entity.
+        sub_service (SubServiceDep): Dependency injection for the service handling subscription logic.
+
+    Returns:
+        Union[schemas.SuccessResp, schemas.FailureResp]:
+            - `schemas.SuccessResp`: The thresholds were updated.
+            - `schemas.FailureResp`: The user is not subscribed to the product or the update failed.
+    """
+    return await sub_service.update_alert_threshold(
+        user_id=user_id,
+        link_id=link_id,
+        target_price=threshold.target_price,
+        min_drop_percent=threshold.min_drop_percent,
+    )
+
+
+@router.get("/product/{link_id}/history")
+async def get_price_history(
+    user_id: UserAuthDep,
+    link_id: str,
+    sub_service: SubServiceDep,
+    resolution: Optional[schemas.HistoryResolution] = None,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+) -> schemas.PriceHistory:
+    """
+    Retrieve the price history of a product.
+
+    The history is served from hourly or daily rollups of every price the monitor has seen, each point holding
+    the lowest, highest and last price of its period.
+
+    Args:
+        user_id (UserAuthDep): The authenticated user's ID, provided by a dependency that manages user
+            authentication.
+        link_id (str): The unique identifier of the product.
+        sub_service (SubServiceDep): Dependency injection for the service that reads the price history.
+        resolution (schemas.HistoryResolution, optional): "hour" or "day". By default ranges of up to a week
+            that are still covered by hourly rollups use "hour", longer ones "day".
+        start (datetime, optional): Start of the range, in UTC unless it has an offset. Default is 30 days
+            before `end`.
+        end (datetime, optional): End of the range, in UTC unless it has an offset. Default is now.
+
+    Returns:
+        schemas.PriceHistory:
+            - The resolution that was used and one `schemas.PricePoint` per period with at least one price,
+              ordered by time.
+
+    Raises:
+        HTTPException: Raises an HTTP 400 Bad Request error if `start` is after `end`.
+
+    Notes:
+        - Hourly rollups are only kept for `HISTORY_HOURLY_RETENTION_DAYS` days, older ranges only have daily points.
+    """
+    return await sub_service.get_price_history(
+        link_id=link_id, resolution=resolution, start=start, end=end
+    )
@@ -142,6 +142,35 @@ async def update_user_info(
     )
 
 
+@router.post("/alert_mode")
+async def update_alert_mode(
+    alert_mode_req: schemas.AlertModeReq,
+    user_id: UserAuthDep,
+    user_service: UserServiceDep,
+) -> Union[schemas.SuccessResp, schemas.FailureResp]:
+    """
+    Choose how the authenticated user is told about price drops.
+
+    With "instant" every price drop is sent in its own email as soon as it is found. With "digest" all drops of
+    the user's products found within the digest window (`DISPATCHER_DIGEST_WINDOW` seconds, one hour by default)
+    are sent together in one email.
+
+    Args:
+        alert_mode_req (schemas.AlertModeReq): Request schema containing the alert mode, "instant" or "digest".
+        user_id (UserAuthDep): The authenticated user's ID. This parameter is typically managed by a dependency
+            that provides the authenticated user's ID.
+        user_service (UserServiceDep): Dependency injection for the user service that handles user updates.
+
+    Returns:
+        Union[schemas.SuccessResp, schemas.FailureResp]:
+            - `schemas.SuccessResp` with a success message if the alert mode is updated successfully.
+            - `schemas.FailureResp` with an error detail if the update fails.
+    """
+    return await user_service.update_alert_mode(
+        user_id=user_id, alert_mode=alert_mode_req.alert_mode
+    )
+
+
 @router.delete("/info")
 async def delete_user(
     user_id: UserAuthDep, user_service: UserServiceDep
@@ -0,0 +1,197 @@
+import argparse
+import re
+import sys
+import time
+from typing import List, NamedTuple, Optional, Union
+
+from lxml import etree
+
+
+# Same locations the Selenium scraper reads on a product detail page
+PRICE_DIV_XPATH = etree.XPath('//*[@id="corePrice_feature_div"]')
+PRICE_WHOLE_XPATH = etree.XPath('.//span[@class="a-price-whole"]')
+PRICE_FRACTION_XPATH = etree.XPath('.//span[@class="a-price-fraction"]')
+TITLE_XPATH = etree.XPath('//*[@id="productTitle"]')
+
+# Search results page. Every result is a <div> under the parent div of the results list
+SERP_CANDIDATES_XPATH = etree.XPath(
+    '//*[@id="search"]/div[1]/div[1]/div/span[1]/div[1]/div'
+)
+SERP_IMG_XPATH = etree.XPath("(.//img)[1]/@src", smart_strings=False)
+SERP_LINK_XPATH = etree.XPath("(.//a)[1]/@href", smart_strings=False)
+SERP_TITLE_XPATH = etree.XPath("normalize-space((.//h2)[1])")
+SERP_RATING_XPATH = etree.XPath(
+    'string((.//text()[contains(., "out of 5 stars")]'
+    ' | .//@aria-label[contains(., "out of 5 stars")])[1])'
+)
+SERP_PRICE_XPATH = etree.XPath(
+    'string((.//span[@class="a-price"]//span[@class="a-offscreen"])[1])'
+)
+RATING_RE = re.compile(r"([0-9.]+) out of 5 stars")
+
+HTML_PARSER = etree.HTMLParser()
+
+
+class ProductDetail(NamedTuple):
+    price: Optional[float]
+    title: Optional[str]
+
+
+class SerpItem(NamedTuple):
+    title: str
+    link: str
+    img_src: str
+    rating: Optional[float]
+    price: Optional[float]
+
+
+def parse_html(html: Union[str, bytes]) -> Optional[etree._Element]:
+    if not html:
+        return None
+    return etree.fromstring(text=html, parser=HTML_PARSER)
+
+
+def join_price(whole: str, fraction: str) -> Optional[float]:
+    """
+    Combine the whole and fraction parts shown on the page into a float.
+
+    Amazon renders the whole part with a thousands separator and a trailing decimal
+    point (e.g. "1,299."), both of which are stripped before conversion.
+    """
+    whole = (whole or "").replace(",", "").strip().rstrip(".")
+    fraction = (fraction or "").strip()
+    try:
+        return float(whole + "." + fraction)
+    except ValueError:
+        return None
+
+
+def parse_price(tree: etree._Element) -> Optional[float]:
+    price_divs = PRICE_DIV_XPATH(tree)
+    if not price_divs:
+        return None
+    whole_elements = PRICE_WHOLE_XPATH(price_divs[0])
+    fraction_elements = PRICE_FRACTION_XPATH(price_divs[0])
+    if not whole_elements or not fraction_elements:
+        return None
+    return join_price(whole_elements[0].text, fraction_elements[0].text)
+
+
+def parse_title(tree: etree._Element) -> Optional[str]:
+    title_elements = TITLE_XPATH(tree)
+    if not title_elements:
+        return None
+    title = "".join(title_elements[0].itertext()).strip()
+    return title or None
+
+
+def parse_product_page(html: Union[str, bytes]) -> ProductDetail:
+    """
+    Extract the price and title from the static HTML of an Amazon product page.
+
+    Returns a `ProductDetail` whose fields are `None` when the page does not contain
+    them, e.g. when the price is only rendered by JavaScript.
+    """
+    tree = parse_html(html)
+    if tree is None:
+        return ProductDetail(price=None, title=None)
+    return ProductDetail(price=parse_price(tree), title=parse_title(tree))
+
+
+def parse_serp_price(text: str) -> Optional[float]:
+    text = text.replace("$", "").replace(",", "").strip()
+    try:
+        return float(text) if text else None
+    except ValueError:
+        return None
+
+
+def parse_search_page(
+    html: Union[str, bytes], base_url: str, max_candidates: Optional[int] = None
+) -> Optional[List[SerpItem]]:
+    """
+    Extract every product on an Amazon search results page in a single pass.
+
+    A result counts as a product when it has an image, a link and a star rating. Only
+    the first `max_candidates` result divs are looked at when it is set. Returns
+    `None` when the page has no results list at all.
+    """
+    tree = parse_html(html)
+    if tree is None:
+        return None
+    candidates = SERP_CANDIDATES_XPATH(tree)
+    if not candidates:
+        return None
+    if max_candidates is not None:
+        candidates = candidates[:max_candidates]
+
+    items = []
+    for candidate in candidates:
+        rating_text = SERP_RATING_XPATH(candidate)
+        if not rating_text:
+            continue
+        img_src = SERP_IMG_XPATH(candidate)
+        href = SERP_LINK_XPATH(candidate)
+        if not img_src or not href:
+            continue
+
+        rating = RATING_RE.search(rating_text)
+        items.append(
+            SerpItem(
+                title=SERP_TITLE_XPATH(candidate),
+                link=href[0] if href[0].startswith("https://") else base_url + href[0],
+                img_src=img_src[0],
+                rating=float(rating.group(1)) if rating else None,
+                price=parse_serp_price(SERP_PRICE_XPATH(candidate)),
+            )
+        )
+    return items
+
+
+def benchmark_search_page(html: bytes, repeat: int) -> float:
+    """
+    Parse `html` `repeat` times and return the average cost per candidate in
+    microseconds.
+    """
+    items = parse_search_page(html, base_url="https://www.amazon.com")
+    if not items:
+        raise ValueError("No products found in the search results page")
+    candidates = len(SERP_CANDIDATES_XPATH(parse_html(html)))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse_search_page(html, base_url="https://www.amazon.com")
+    elapsed = time.perf_counter() - start
+    return elapsed / repeat / candidates * 1e6
+
+
+if __name__ == "__main__":
+    # Parse saved pages offline, e.g.
+    #   python -m scraper.amazon.amazon_parser product tests/fixtures/amazon_product.html
+    #   python -m scraper.amazon.amazon_parser serp tests/fixtures/amazon_serp.html --budget-us 500
+    parser = argparse.ArgumentParser()
+    parser.add_argument("kind", choices=["product", "serp"])
+    parser.add_argument("path")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument(
+        "--budget-us",
+        type=float,
+        default=None,
+        help="Exit with an error if parsing costs more than this per candidate",
+    )
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as file:
+        html = file.read()
+
+    if args.kind == "product":
+        print(parse_product_page(html))
+        sys.exit(0)
+
+    for item in parse_search_page(html, base_url="https://www.amazon.com") or []:
+        print(item)
+    cost = benchmark_search_page(html, repeat=args.repeat)
+    print(f"{cost:.1f} us per candidate over {args.repeat} runs")
+    if args.budget_us is not None and cost > args.budget_us:
+        print(f"Over budget of {args.budget_us:.1f} us per candidate")
+        sys.exit(1)
@@ -7,18 +7,30 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from time import sleep
 import os
-from lxml import etree
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List
 
 
 from scraper.utils import *
+from scraper.driver_pool import get_driver_pool
+from scraper.http_fetch import fetch_html
+from scraper.parse_pool import get_parse_pool
+from scraper.snapshot import get_snapshot_archive
+from scraper.amazon.amazon_parser import (
+    ProductDetail,
+    SerpItem,
+    parse_product_page,
+    parse_search_page,
+)
 from lib import schemas
+from lib.cache import SearchCache
 from lib.utils import hash256, get_logger
+from lib.singleflight import SingleFlight
+from config import get_settings
 
 
 BASE_URL = "https://www.amazon.com"
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-HTML_PATH = CURRENT_DIR + "/html"
 
 # Configure logging
 logger = get_logger(
@@ -28,146 +40,239 @@ logger = get_logger(
 )
 
 
+def snapshot(html: str, label: str) -> None:
+    """
+    Archive a scraped page for debugging when snapshots are enabled.
+    """
+    archive = get_snapshot_archive()
+    if archive is not None:
+        archive.save(html=html, label=label)
+
+
+# Identical searches or price checks running at the same time share one scrape
+scrape_flight = SingleFlight()
+
+
 def amazon_search(
     keyword: str, include: str = None, max_prod: int = 3
 ) -> Optional[List[schemas.Product]]:
+    # The same key as the search cache, so a cached search and a coalesced one never
+    # disagree about which searches are the same
+    key = (
+        "search",
+        SearchCache.make_key(
+            vendor="amazon", kw=keyword, include=include, max_prod=max_prod
+        ),
+    )
+    return scrape_flight.do(
+        key, _amazon_search, keyword=keyword, include=include, max_prod=max_prod
+    )
+
+
+def _amazon_search(
+    keyword: str, include: str = None, max_prod: int = 3
+) -> Optional[List[schemas.Product]]:
 
     include = include or ""
     include_ls = include.split(" ")
+    settings = get_settings()
+
+    try:
+        with get_driver_pool().driver() as driver:
+            candidates = _search_candidates(driver=driver, keyword=keyword)
+    except TimeoutError as err:
+        logger.error(f"Search for {keyword} aborted. {err}")
+        return None
+    if candidates is None:
+        return None
+
+    # Drop results whose title on the search page already misses an include word, so
+    # we never navigate to them. Results without a title are kept and checked on the
+    # product page instead.
+    candidates = [
+        c for c in candidates if not c.title or has_include(c.title, include_ls)
+    ]
+
+    # The product pages are fetched concurrently, but never more at once than the
+    # number of products still missing, and results are consumed in the order of the
+    # candidates. Fetching stops as soon as max_prod products are accepted.
+    products = []
+    pending = deque()
+    remaining = iter(candidates)
+    workers = max(1, settings.search_workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while len(products) < max_prod:
+            while len(pending) < min(workers, max_prod - len(products)):
+                candidate = next(remaining, None)
+                if candidate is None:
+                    break
+                pending.append(
+                    (candidate, executor.submit(_fetch_detail, candidate.link))
+                )
+            if not pending:
+                break
+
+            candidate, future = pending.popleft()
+            product = _to_product(
+                candidate=candidate,
+                detail=future.result(),
+                include_ls=include_ls,
+                confirm_include=settings.search_confirm_include,
+            )
+            if product:
+                products.append(product)
+
+        for _, future in pending:
+            future.cancel()
+
+    return products
 
-    driver = webdriver.Chrome()
-    driver.implicitly_wait(5)
-    driver.get(f"https://www.amazon.com/s?k={keyword}")
-    sleep(3)  # Wait enough time for the page to load
-    page_source = driver.page_source
-    with open(HTML_PATH + "/page_source.html", "w") as file:
-        file.write(page_source)
 
-    tree = etree.fromstring(text=page_source, parser=etree.HTMLParser())
+def has_include(title: str, include_ls: List[str]) -> bool:
+    for word in include_ls:
+        if word.lower() not in title.lower():
+            return False
+    return True
 
-    # The parent div contains all the potential products
-    parent = tree.xpath('//*[@id="search"]/div[1]/div[1]/div/span[1]/div[1]')[0]
-    if parent is None:
+
+def _to_product(
+    candidate: SerpItem,
+    detail: ProductDetail,
+    include_ls: List[str],
+    confirm_include: bool,
+) -> Optional[schemas.Product]:
+    product_link = candidate.link
+    if detail.price is None:
+        logger.error(f"No price found for link: {product_link}")
+        return None
+    if detail.title is None:
+        logger.error(f"No title found for link: {product_link}")
         return None
-    parent_str = etree.tostring(element_or_tree=parent).decode()
-    with open(CURRENT_DIR + "/html/parent.html", "w") as file:
-        file.write(parent_str)
 
-    potential_products = parent.xpath("./div")
-    if not potential_products:
+    # The title on the product page can differ from the search page one
+    if (confirm_include or not candidate.title) and not has_include(
+        detail.title, include_ls
+    ):
         return None
 
-    # Iterate through the list to find which <div> contains a product
-    # Criteria:
-    #   has to have an image
-    #   has to contain 'out of 5 stars'
-    #   has to contain a <a> tag
-    #   has to include every word in the "include" list
+    return schemas.Product(
+        title=detail.title,
+        vendor=schemas.Vendor.AMAZON.value,
+        link=product_link,
+        link_id=hash256(keyword=product_link),
+        img_src=candidate.img_src,
+        price=detail.price,
+    )
+
+
+def _search_candidates(
+    driver: webdriver.Chrome, keyword: str
+) -> Optional[List[SerpItem]]:
+    """
+    Load the search results page and return every result that looks like a product.
+    """
+    driver.get(f"https://www.amazon.com/s?k={keyword}")
+    sleep(3)  # Wait enough time for the page to load
+    page_source = driver.page_source
+    snapshot(html=page_source, label=f"search {keyword}")
+
+    # A result is a product if it has an image, a <a> tag and contains
+    # 'out of 5 stars'
+    candidates = get_parse_pool().parse(
+        parse_search_page, html=page_source, base_url=BASE_URL
+    )
+    if not candidates:
+        return None
 
-    products = []
-    html_str = ""  # For debugging purpose
-
-    count = (
-        -1
-    )  # During DEV mode, we limit the number of iteration to avoid taking up too much time for testing.
-    max_iter = max_prod
-
-    for potential_product in potential_products:
-        count += 1
-        if count > max_iter:
-            break
-        image_elements = potential_product.xpath(".//img")
-        link_elements = potential_product.xpath(".//a")
-
-        potential_product_element_str = etree.tostring(
-            element_or_tree=potential_product
-        ).decode()
-        if (
-            not image_elements
-            or not link_elements
-            or not "out of 5 stars" in potential_product_element_str
-        ):
-            continue
-        src = image_elements[0].get("src")
-        href = link_elements[0].get("href")
-
-        product_link = href if href.startswith("https://") else BASE_URL + href
-
-        # For debugging
-        html_str += f'<a href="{product_link}"> LINK </a>'
-        html_str += f'<img src="{src}" / >'
-
-        driver.get(product_link)
-
-        # getting the price of the product
-        try:
-            price_div_element = driver.find_element(
-                by=By.XPATH, value='//*[@id="corePrice_feature_div"]'
-            )
-            price_whole_element = price_div_element.find_element(
-                by=By.XPATH, value='.//span[@class="a-price-whole"]'
-            )
-            price_fraction_element = price_div_element.find_element(
-                by=By.XPATH, value='.//span[@class="a-price-fraction"]'
-            )
-        except:
-            logger.error(f"No price found for link: {product_link}")
-            continue
+    return candidates
 
-        price_whole = price_whole_element.text
-        price_fraction = price_fraction_element.text
-        price = price_whole + "." + price_fraction
 
-        try:
-            price = float(price)
-        except:  # Not able to get the price from the page (might be out of stock)
-            price = -1.0
+def _fetch_detail(link: str) -> ProductDetail:
+    """
+    Get the price and title of a product page, trying plain HTTP first when enabled
+    and borrowing a pooled browser otherwise.
+    """
+    if get_settings().scraper_fetch_mode == "http":
+        detail = amazon_fetch_detail(link)
+        if detail.price is not None and detail.title is not None:
+            return detail
 
-        try:
+    try:
+        with get_driver_pool().driver() as driver:
+            driver.get(link)
+            return _read_detail(driver=driver)
+    except TimeoutError as err:
+        logger.error(f"Fetching details for {link} aborted. {err}")
+        return ProductDetail(price=None, title=None)
 
-            title_element = driver.find_element(
-                by=By.XPATH, value='//*[@id="productTitle"]'
-            )
-            title = title_element.text
 
-            has_include = True
-            for word in include_ls:
-                if word.lower() not in title.lower():
-                    has_include = False
-                    break
-            if (
-                not has_include
-            ):  # The title of this product does not contain the include keywords
-
-                continue
-        except:
-            logger.error(f"No title found for link: {product_link}")
-            continue
-
-        product = schemas.Product(
-            title=title,
-            vendor=schemas.Vendor.AMAZON.value,
-            link=product_link,
-            link_id=hash256(keyword=product_link),
-            img_src=src,
-            price=price,
+def _read_detail(driver: webdriver.Chrome) -> ProductDetail:
+    # getting the price of the product
+    try:
+        price_div_element = driver.find_element(
+            by=By.XPATH, value='//*[@id="corePrice_feature_div"]'
+        )
+        price_whole_element = price_div_element.find_element(
+            by=By.XPATH, value='.//span[@class="a-price-whole"]'
         )
+        price_fraction_element = price_div_element.find_element(
+            by=By.XPATH, value='.//span[@class="a-price-fraction"]'
+        )
+    except:
+        return ProductDetail(price=None, title=None)
 
-        products.append(product)
+    price_whole = price_whole_element.text
+    price_fraction = price_fraction_element.text
+    price = price_whole + "." + price_fraction
 
-    with open(CURRENT_DIR + "/html/products.html", "w") as file:
-        file.write(html_str)
+    try:
+        price = float(price)
+    except:  # Not able to get the price from the page (might be out of stock)
+        price = -1.0
 
-    return products
+    try:
+        title_element = driver.find_element(
+            by=By.XPATH, value='//*[@id="productTitle"]'
+        )
+        title = title_element.text
+    except:
+        title = None
+
+    return ProductDetail(price=price, title=title)
+
+
+def amazon_fetch_detail(link: str) -> ProductDetail:
+    """
+    Read the price and title of a product page without starting a browser.
+
+    The fields of the returned `ProductDetail` are `None` if the request failed or the
+    static HTML does not contain them.
+    """
+    html = fetch_html(url=link, timeout=get_settings().scraper_http_timeout)
+    return get_parse_pool().parse(parse_product_page, html)
 
 
 def amazon_track_price(link: str) -> Optional[float]:
-    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return scrape_flight.do(("price", link), _amazon_track_price, link=link)
 
-    driver = webdriver.Chrome()
-    driver.get(link)
-    driver.implicitly_wait(5)
 
+def _amazon_track_price(link: str) -> Optional[float]:
+    if get_settings().scraper_fetch_mode == "http":
+        price = amazon_fetch_detail(link).price
+        if price is not None:
+            return price
+        logger.info(f"No price in static HTML for {link}, falling back to browser")
+
+    try:
+        with get_driver_pool().driver() as driver:
+            driver.get(link)
+            return _read_price(driver=driver)
+    except TimeoutError as err:
+        logger.error(f"Price tracking for {link} aborted. {err}")
+        return None
+
+
+def _read_price(driver: webdriver.Chrome) -> Optional[float]:
     price = None
 
     try:
@@ -188,14 +293,11 @@ def amazon_track_price(link: str) -> Optional[float]:
         price_fraction = price_fraction_element.text
         price = price_whole + "." + price_fraction
     except Exception as err:
-        print("Price not found.")
-        print(err)
-
-    # For debugging purpose
-    # with open(current_dir + "/page_source/prod_detail.html", "w") as file:
-    #     file.write(driver.page_source)
-
-    driver.quit()
+        logger.warning(f"Price not found. {err}")
+        # Reading the page source and URL are browser round trips, skip them unless
+        # the page is archived
+        if get_snapshot_archive() is not None:
+            snapshot(html=driver.page_source, label=f"product {driver.current_url}")
 
     if not price:
         return None
@@ -203,7 +305,7 @@ def amazon_track_price(link: str) -> Optional[float]:
     try:
         price = float(price)
     except Exception as err:
-        print(err)
+        logger.error(f"Could not read price {price!r}. {err}")
         return
 
     return price
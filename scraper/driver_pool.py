@@ -0,0 +1,223 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+from config import get_settings
+from lib.utils import get_logger
+
+
+logger = get_logger(
+    name=__name__,
+    filename=os.getcwd() + "/log/scraper.log",
+    fmt="%(asctime)s - %(levelname)s - DRIVER POOL - %(message)s",
+)
+
+
+class PooledDriver:
+    """
+    Thin wrapper around a ``webdriver.Chrome`` that counts page loads so the pool
+    knows when to recycle the browser. Every other attribute is forwarded to the
+    underlying driver, so callers can use it exactly like a normal driver.
+    """
+
+    def __init__(self, driver: webdriver.Chrome) -> None:
+        self.driver = driver
+        self.pages = 0
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+    def get(self, url: str) -> None:
+        self.pages += 1
+        self.driver.get(url)
+
+    def is_healthy(self) -> bool:
+        try:
+            # Any round trip to the browser fails if the process or session is gone
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def quit(self) -> None:
+        try:
+            self.driver.quit()
+        except Exception as err:
+            logger.error(f"Failed to quit driver. {err}")
+
+    def __getattr__(self, name: str):
+        return getattr(self.driver, name)
+
+
+class DriverPool:
+    """
+    Bounded, thread-safe pool of headless Chrome drivers.
+
+    At most ``max_size`` browsers are alive at any time. Drivers are health checked on
+    checkout, recycled after ``max_pages`` page loads and closed once they have been
+    idle for longer than ``max_idle_seconds``. New browsers come from
+    ``driver_factory``, a headless Chrome by default.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 2,
+        max_pages: int = 50,
+        checkout_timeout: float = 60,
+        max_idle_seconds: float = 300,
+        headless: bool = True,
+        driver_factory: Optional[Callable[[], webdriver.Chrome]] = None,
+    ) -> None:
+        self.max_size = max_size
+        self.max_pages = max_pages
+        self.checkout_timeout = checkout_timeout
+        self.max_idle_seconds = max_idle_seconds
+        self.headless = headless
+        self.driver_factory = driver_factory or self._start_chrome
+
+        self._idle: List[PooledDriver] = []
+        self._in_use = 0
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._created = 0
+        self._recycled = 0
+        self._discarded = 0
+        self._checkouts = 0
+        self._wait_time = 0.0
+
+    def checkout(self) -> PooledDriver:
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise TimeoutError(
+                f"No driver available after waiting {self.checkout_timeout} seconds"
+            )
+        try:
+            self.evict_idle()
+            pooled = None
+            while pooled is None:
+                with self._lock:
+                    candidate = self._idle.pop() if self._idle else None
+                if candidate is None:
+                    pooled = self._create_driver()
+                elif candidate.is_healthy():
+                    pooled = candidate
+                else:
+                    logger.info("Discarding unhealthy driver")
+                    candidate.quit()
+                    with self._lock:
+                        self._discarded += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_time += time.monotonic() - start
+        return pooled
+
+    def checkin(self, pooled: PooledDriver, healthy: bool = True) -> None:
+        pooled.last_used = time.time()
+        try:
+            if not healthy:
+                logger.info("Discarding driver that failed during use")
+                pooled.quit()
+                with self._lock:
+                    self._discarded += 1
+            elif pooled.pages >= self.max_pages:
+                logger.info(f"Recycling driver after {pooled.pages} pages")
+                pooled.quit()
+                with self._lock:
+                    self._recycled += 1
+            else:
+                with self._lock:
+                    self._idle.append(pooled)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def driver(self) -> Iterator[PooledDriver]:
+        pooled = self.checkout()
+        healthy = True
+        try:
+            yield pooled
+        except WebDriverException:
+            healthy = False
+            raise
+        finally:
+            self.checkin(pooled, healthy=healthy)
+
+    def evict_idle(self) -> None:
+        now = time.time()
+        with self._lock:
+            stale = [
+                d for d in self._idle if now - d.last_used > self.max_idle_seconds
+            ]
+            self._idle = [d for d in self._idle if d not in stale]
+            self._recycled += len(stale)
+        for d in stale:
+            d.quit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "size": len(self._idle) + self._in_use,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "created": self._created,
+                "recycled": self._recycled,
+                "discarded": self._discarded,
+                "checkouts": self._checkouts,
+                "avg_wait_seconds": (
+                    self._wait_time / self._checkouts if self._checkouts else 0.0
+                ),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for d in idle:
+            d.quit()
+
+    def _create_driver(self) -> PooledDriver:
+        driver = self.driver_factory()
+        with self._lock:
+            self._created += 1
+        logger.info("Started a new driver")
+        return PooledDriver(driver=driver)
+
+    def _start_chrome(self) -> webdriver.Chrome:
+        options = webdriver.ChromeOptions()
+        if self.headless:
+            options.add_argument("--headless=new")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        driver = webdriver.Chrome(options=options)
+        driver.implicitly_wait(5)
+        return driver
+
+
+@lru_cache
+def get_driver_pool() -> DriverPool:
+    settings = get_settings()
+    pool = DriverPool(
+        max_size=settings.driver_pool_size,
+        max_pages=settings.driver_max_pages,
+        checkout_timeout=settings.driver_checkout_timeout,
+        max_idle_seconds=settings.driver_max_idle_seconds,
+        headless=settings.driver_headless,
+    )
+    atexit.register(pool.close)
+    return pool
@@ -0,0 +1,54 @@
+import os
+import threading
+from typing import Optional
+
+import requests
+
+from lib.utils import get_logger
+
+
+logger = get_logger(
+    name=__name__,
+    filename=os.getcwd() + "/log/scraper.log",
+    fmt="%(asctime)s - %(levelname)s - HTTP - %(message)s",
+)
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# requests.Session is not guaranteed to be thread safe, so keep one per thread.
+# Each session reuses its keep-alive connections across fetches.
+_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        _local.session = session
+    return session
+
+
+def fetch_html(url: str, timeout: float = 10) -> Optional[bytes]:
+    """
+    Fetch the raw HTML of a page with a plain HTTP GET.
+
+    Returns `None` on network errors or non-200 responses so the caller can fall back
+    to the browser.
+    """
+    try:
+        res = get_session().get(url, timeout=timeout)
+        if res.status_code != 200:
+            logger.info(f"Got status code {res.status_code} for {url}")
+            return None
+        return res.content
+    except requests.RequestException as err:
+        logger.error(f"Failed to fetch {url}. {err}")
+        return None
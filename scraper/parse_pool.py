@@ -0,0 +1,120 @@
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Any, Callable, List, Optional
+
+from config import get_settings
+from lib.logger import get_logger
+from scraper.amazon.amazon_parser import parse_product_page, parse_search_page
+
+
+logger = get_logger(
+    name=__name__,
+    filename=os.getcwd() + "/log/scraper.log",
+    fmt="%(asctime)s - %(levelname)s - PARSE - %(message)s",
+)
+
+
+class ParsePool:
+    """
+    Run HTML parsers inline or in a pool of worker processes.
+
+    Parsing and XPath extraction are CPU bound and hold the GIL, so with many pages
+    fetched concurrently by threads they all queue up on one core. With
+    ``processes`` set, `parse` ships the raw HTML to a worker process instead and
+    the calling thread only waits for the small result. The parser must be a module
+    level function so it can be pickled. The workers are started on first use, with
+    spawn rather than fork: the scraper process runs browser and thread pools whose
+    locks a forked child could inherit while held.
+    """
+
+    def __init__(self, processes: Optional[int] = None) -> None:
+        self.processes = processes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def parse(self, parser: Callable[..., Any], *args, **kwargs) -> Any:
+        if not self.processes:
+            return parser(*args, **kwargs)
+        try:
+            return self._get_executor().submit(parser, *args, **kwargs).result()
+        except BrokenProcessPool as err:
+            # A worker died, e.g. killed for memory. Start a new pool next time
+            logger.error(f"Parse process pool broke, parsing inline. {err}")
+            self._reset()
+            return parser(*args, **kwargs)
+
+    def map(self, parser: Callable[[Any], Any], pages: List[Any]) -> List[Any]:
+        if not self.processes:
+            return [parser(page) for page in pages]
+        chunksize = max(1, len(pages) // (self.processes * 4))
+        return list(self._get_executor().map(parser, pages, chunksize=chunksize))
+
+    def close(self) -> None:
+        self._reset()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _reset(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+@lru_cache
+def get_parse_pool() -> ParsePool:
+    settings = get_settings()
+    if settings.scraper_parse_mode == "inline":
+        return ParsePool()
+    return ParsePool(processes=settings.scraper_parse_processes or os.cpu_count())
+
+
+def _parse_serp(html: bytes) -> Any:
+    return parse_search_page(html, base_url="https://www.amazon.com")
+
+
+if __name__ == "__main__":
+    # Measure parse throughput of a saved page for several pool sizes, e.g.
+    #   python -m scraper.parse_pool product prod_detail.html --processes 1 2 4 8
+    parser = argparse.ArgumentParser()
+    parser.add_argument("kind", choices=["product", "serp"])
+    parser.add_argument("path")
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument(
+        "--processes", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()]
+    )
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as file:
+        html = file.read()
+    parse = parse_product_page if args.kind == "product" else _parse_serp
+    pages = [html] * args.pages
+
+    baseline = None
+    for processes in [0] + sorted(set(args.processes)):
+        pool = ParsePool(processes=processes)
+        pool.map(parse, pages[: max(1, processes)])  # Start the workers
+        start = time.perf_counter()
+        pool.map(parse, pages)
+        elapsed = time.perf_counter() - start
+        pool.close()
+
+        throughput = args.pages / elapsed
+        baseline = baseline or throughput
+        label = f"{processes} processes" if processes else "inline"
+        print(
+            f"{label:>12}: {throughput:8.1f} pages/s, {throughput / baseline:.2f}x inline"
+        )
@@ -0,0 +1,91 @@
+import gzip
+import hashlib
+import os
+import queue
+import threading
+from functools import lru_cache
+from typing import Optional
+
+from config import get_settings
+from lib.utils import get_logger
+
+
+logger = get_logger(
+    name=__name__,
+    filename=os.getcwd() + "/log/scraper.log",
+    fmt="%(asctime)s - %(levelname)s - SNAPSHOT - %(message)s",
+)
+
+
+class SnapshotArchive:
+    """
+    Write-behind archive of scraped pages for debugging.
+
+    Pages are handed to a background thread, gzipped and stored under the SHA-256 of
+    their content, so identical pages are only stored once. Only the newest
+    ``retention`` snapshots are kept. When the writer falls behind, new snapshots are
+    dropped rather than slowing down the scrape.
+    """
+
+    def __init__(self, directory: str, retention: int = 200, max_pending: int = 100):
+        self.directory = directory
+        self.retention = retention
+        os.makedirs(directory, exist_ok=True)
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def save(self, html: str, label: str) -> None:
+        try:
+            self._queue.put_nowait((html, label))
+        except queue.Full:
+            logger.info(f"Snapshot queue is full, dropping snapshot of {label}")
+
+    def _run(self) -> None:
+        while True:
+            html, label = self._queue.get()
+            try:
+                self._write(html=html, label=label)
+            except Exception as err:
+                logger.error(f"Failed to write snapshot of {label}. {err}")
+
+    def _write(self, html: str, label: str) -> None:
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.directory, f"{digest}.html.gz")
+        if os.path.exists(path):
+            # Same content as an earlier snapshot, only mark it as recent
+            os.utime(path)
+        else:
+            tmp_path = path + ".tmp"
+            with gzip.open(tmp_path, "wb") as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+        logger.info(f"Saved snapshot of {label} as {digest}")
+        self._prune()
+
+    def _prune(self) -> None:
+        entries = [
+            e
+            for e in os.scandir(self.directory)
+            if e.is_file() and e.name.endswith(".html.gz")
+        ]
+        if len(entries) <= self.retention:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for e in entries[: len(entries) - self.retention]:
+            os.remove(e.path)
+
+
+@lru_cache
+def get_snapshot_archive() -> Optional[SnapshotArchive]:
+    """
+    Return the shared archive, or `None` when snapshots are disabled.
+    """
+    settings = get_settings()
+    if not settings.scraper_snapshot_dir:
+        return None
+    return SnapshotArchive(
+        directory=settings.scraper_snapshot_dir,
+        retention=settings.scraper_snapshot_retention,
+    )
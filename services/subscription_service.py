@@ -1,6 +1,6 @@
 import random
 from typing import Annotated, Union
-from fastapi import Depends
+from fastapi import Depends, HTTPException
 import hashlib
 import jwt
 import datetime
@@ -18,6 +18,7 @@ from enum import Enum
 from config import *
 from scraper.amazon.amazon_search import amazon_search
 from lib.utils import get_logger
+from lib.cache import SearchCache, get_search_cache
 
 
 SettingsDep = Annotated[Settings, Depends(get_settings)]
@@ -31,6 +32,8 @@ class SubscriptionService:
         self.email_from = settings.email_from
         self.app_password = settings.app_password
         self.secret = settings.secret
+        self.history_hourly_retention_days = settings.history_hourly_retention_days
+        self.subscribe_max_products = settings.subscribe_max_products
         self.async_db = async_db
 
     def search(
@@ -44,26 +47,80 @@ class SubscriptionService:
         logger.info(
             f"Initializing product search for user id {user_id}, keyword {kw}, vendor {vendor}, must include keyword {include}"
         )
+        search_cache = get_search_cache()
+        key = SearchCache.make_key(
+            vendor=vendor, kw=kw, include=include, max_prod=max_prod
+        )
+        products = search_cache.get(key)
+        if products is not None:
+            logger.info(
+                f"Cached products found for user id {user_id}, keyword {kw}, vendor {vendor}, must include keyword {include}"
+            )
+            return products
+
         if vendor == "amazon":
             products = amazon_search(keyword=kw, include=include, max_prod=max_prod)
             if products:
                 logger.info(
                     f"Products found for user id {user_id}, keyword {kw}, vendor {vendor}, must include keyword {include}"
                 )
+                search_cache.set(key, products)
                 return products
             logger.info(
                 f"Products not found for user id {user_id}, keyword {kw}, vendor {vendor}, must include keyword {include}"
             )
 
-    async def get_products(self, user_id: str) -> Optional[List[schemas.Product]]:
-        subscriptions = await crud.get_all_sub(db=self.async_db, user_id=user_id)
-        products = []
-        for sub in subscriptions:
-            product = await crud.get_product_by_id(
-                db=self.async_db, link_id=sub.link_id
+    async def get_products(
+        self, user_id: str, limit: int = 50, cursor: Optional[str] = None
+    ) -> schemas.ProductPage:
+        # One extra row tells whether there is a next page
+        products = await crud.get_subscribed_products(
+            db=self.async_db, user_id=user_id, limit=limit + 1, after=cursor
+        )
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            next_cursor = products[-1].link_id
+        return schemas.ProductPage(
+            products=[schemas.Product.model_validate(p) for p in products],
+            next_cursor=next_cursor,
+        )
+
+    async def get_price_history(
+        self,
+        link_id: str,
+        resolution: Optional[schemas.HistoryResolution] = None,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+    ) -> schemas.PriceHistory:
+        # Query strings with an offset parse as aware datetimes, the history is in
+        # naive UTC
+        end = crud.to_naive_utc(end) if end else datetime.datetime.utcnow()
+        start = crud.to_naive_utc(start) if start else end - datetime.timedelta(days=30)
+        if start > end:
+            raise HTTPException(status_code=400, detail="start must not be after end")
+        if resolution is None:
+            # Hourly points for short ranges that are still covered by hourly rollups
+            hourly_since = datetime.datetime.utcnow() - datetime.timedelta(
+                days=self.history_hourly_retention_days
             )
-            products.append(product)
-        return products
+            short = end - start <= datetime.timedelta(days=7)
+            resolution = "hour" if short and start >= hourly_since else "day"
+        logger.info(
+            f"Getting {resolution} price history of link id {link_id} from {start} to {end}"
+        )
+        rollups = await crud.get_price_rollups(
+            db=self.async_db,
+            link_id=link_id,
+            resolution=resolution,
+            start=start,
+            end=end,
+        )
+        return schemas.PriceHistory(
+            link_id=link_id,
+            resolution=resolution,
+            points=[schemas.PricePoint.model_validate(r) for r in rollups],
+        )
 
     async def subscribe(
         self, user_id: str, product: schemas.Product
@@ -71,38 +128,54 @@ class SubscriptionService:
         logger.info(
             f"User with id {user_id} trying to subscribe to link {product.link}"
         )
-        link_id = product.link_id
-        # First look through the subscription table to see if the combination already existed
-        subscription = await crud.get_subscription(
-            db=self.async_db, user_id=user_id, link_id=link_id
+        # The product and the subscription are created in one transaction, either
+        # both exist afterwards or neither was written
+        subscribed = await crud.subscribe_products(
+            db=self.async_db, user_id=user_id, products=[product]
         )
-
-        # The subscription already exists
-        if subscription:
+        if subscribed is None:
+            return schemas.FailureResp(detail="Failed to subscribe to this product")
+        if not subscribed:
             logger.info(
-                f"The subscription with user id {user_id} and link id {link_id} already exists"
+                f"The subscription with user id {user_id} and link id {product.link_id} already exists"
             )
-            # print(res.user_id, res.link_id)
             return schemas.FailureResp(
                 detail="You have already subscribed to this product"
             )
-
-        # Now we create a new subscription
-        await crud.create_subscription(
-            db=self.async_db, user_id=user_id, link_id=link_id
+        return schemas.SuccessResp(
+            detail="You have successfully subscribed to this product"
         )
 
-        # Check if the product already exists in the Product table
-        product_in_db = await crud.get_product_by_id(db=self.async_db, link_id=link_id)
-
-        # It already exists. Do nothing. If not create a new product
-        if not product_in_db:
-            logger.info(
-                f"Creating a new product with link id {product.link_id} for user with id {user_id}"
+    async def subscribe_many(
+        self, user_id: str, products: List[schemas.Product]
+    ) -> Union[schemas.SuccessResp, schemas.FailureResp]:
+        logger.info(f"User with id {user_id} trying to subscribe to {len(products)} links")
+        if len(products) > self.subscribe_max_products:
+            return schemas.FailureResp(
+                detail=f"At most {self.subscribe_max_products} products can be subscribed to at once"
             )
-            await crud.create_product(db=self.async_db, product=product)
+        subscribed = await crud.subscribe_products(
+            db=self.async_db, user_id=user_id, products=products
+        )
+        if subscribed is None:
+            return schemas.FailureResp(detail="Failed to subscribe to these products")
         return schemas.SuccessResp(
-            detail="You have successfully subscribed to this product"
+            detail=f"You have successfully subscribed to {subscribed} new products"
+        )
+
+    async def update_alert_threshold(
+        self,
+        user_id: str,
+        link_id: str,
+        target_price: Optional[float],
+        min_drop_percent: Optional[float],
+    ) -> Union[schemas.SuccessResp, schemas.FailureResp]:
+        return await crud.update_alert_threshold(
+            db=self.async_db,
+            user_id=user_id,
+            link_id=link_id,
+            target_price=target_price,
+            min_drop_percent=min_drop_percent,
         )
 
     async def unsubscribe(
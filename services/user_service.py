@@ -6,7 +6,6 @@ import hashlib
 import jwt
 import datetime
 from fastapi.responses import JSONResponse
-import smtplib
 from sqlalchemy.ext.asyncio import AsyncSession
 from email.message import EmailMessage
 import logging
@@ -17,6 +16,7 @@ from lib.otp_storage import SessionStore
 from lib import schemas
 from db import crud, get_async_db
 from lib.utils import get_logger
+from lib.mailer import get_mailer
 
 
 sessions = SessionStore()
@@ -120,6 +120,21 @@ class UserService:
                 detail="Unable to update user info at the moment, please try again later"
             )
 
+    async def update_alert_mode(
+        self, user_id: str, alert_mode: schemas.AlertMode
+    ) -> Union[schemas.SuccessResp, schemas.FailureResp]:
+        try:
+            await crud.update_alert_mode(
+                db=self.async_db, user_id=user_id, alert_mode=alert_mode
+            )
+            how = "as a digest" if alert_mode == "digest" else "instantly"
+            return schemas.SuccessResp(detail=f"Price alerts are now sent {how}")
+        except Exception as err:
+            logger.info(f"Failed to update alert mode for user with id {user_id}")
+            return schemas.FailureResp(
+                detail="Unable to update alert mode at the moment, please try again later"
+            )
+
     async def delete_user(
         self, user_id: str
     ) -> Union[schemas.SuccessResp, schemas.FailureResp]:
@@ -139,12 +154,9 @@ class UserService:
             msg["From"] = self.email_from
             msg["To"] = email_to
 
-            # Connect to Gmail's SMTP server
-            connection = smtplib.SMTP("smtp.gmail.com", 587)
-            connection.starttls()
-            connection.login(user=self.email_from, password=self.app_password)
-            connection.send_message(msg=msg)
-            connection.quit()
+            # Reuses one of the pooled SMTP connections
+            if not get_mailer().send(msg=msg):
+                logger.error(f"Failed to send the one-time password to {email_to}")
         except Exception as err:
             logger.error(f"Email sending error, {err}")
 
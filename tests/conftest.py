@@ -0,0 +1,61 @@
+import contextlib
+import os
+from typing import AsyncIterator, Iterator
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The loggers write to log/ relative to the working directory
+os.chdir(ROOT)
+os.makedirs("log", exist_ok=True)
+
+# Settings without defaults, the tests never connect to these
+for name in [
+    "DB_HOST",
+    "DB_USER",
+    "DB_PASSWD",
+    "DB_NAME",
+    "SECRET",
+    "EMAIL_FROM",
+    "APP_PASSWORD",
+]:
+    os.environ.setdefault(name, "test")
+
+from db.base import Base  # noqa: E402
+
+
+@pytest.fixture
+def sqlite_db() -> Iterator[Session]:
+    """
+    Session on a fresh in-memory SQLite database with every table.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        yield db
+    engine.dispose()
+
+
+@pytest.fixture
+def sqlite_session():
+    """
+    Factory of async sessions on a fresh in-memory SQLite database with every table.
+    """
+
+    @contextlib.asynccontextmanager
+    async def session() -> AsyncIterator[AsyncSession]:
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                yield db
+        finally:
+            await engine.dispose()
+
+    return session
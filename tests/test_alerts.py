@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from db import crud, models
+from lib.alerts import PriceDrop, should_alert
+
+
+NAN = np.nan
+
+
+def alert(old, new, target=NAN, min_drop=NAN) -> list:
+    return should_alert(
+        old_prices=np.array(old, dtype=float),
+        new_prices=np.array(new, dtype=float),
+        target_prices=np.array(target, dtype=float),
+        min_drop_percents=np.array(min_drop, dtype=float),
+    ).tolist()
+
+
+def test_no_thresholds():
+    # Every drop is an alert, a rise or the same price is not
+    assert alert([100, 100, 100], [99, 100, 101], [NAN] * 3, [NAN] * 3) == [
+        True,
+        False,
+        False,
+    ]
+
+
+def test_target_price_only():
+    assert alert([100, 100, 100], [90, 80, 70], [80] * 3, [NAN] * 3) == [
+        False,
+        True,
+        True,
+    ]
+
+
+def test_min_drop_percent_only():
+    assert alert([100, 100, 200], [95, 90, 190], [NAN] * 3, [10] * 3) == [
+        False,
+        True,
+        False,
+    ]
+
+
+def test_both_thresholds():
+    # Below the target but too small a drop, big enough but above the target, both
+    assert alert([100, 100, 100], [79, 50, 60], [80, 40, 60], [25, 10, 30]) == [
+        False,
+        False,
+        True,
+    ]
+
+
+def test_null_thresholds_are_nan():
+    # What enqueue_notifications builds from NULL columns
+    targets = np.array([None, 95], dtype=float)
+    min_drops = np.array([5, None], dtype=float)
+    assert np.isnan(targets[0]) and np.isnan(min_drops[1])
+    assert alert([100, 100], [90, 90], targets, min_drops) == [True, True]
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    [(0, 0), (0, -1), (NAN, 10), (100, -1)],
+    ids=["zero", "zero-unavailable", "missing", "unavailable"],
+)
+def test_unknown_or_zero_old_price(old, new):
+    assert alert([old], [new], [NAN], [0]) == [False]
+
+
+def test_update_product_prices_enqueues_qualifying_subscribers(sqlite_db):
+    sqlite_db.add(models.Product(link_id="p1", price=100))
+    thresholds = {
+        "anything": (None, None),
+        "target-too-low": (80, None),
+        "target-met": (95, None),
+        "drop-too-small": (None, 20),
+        "drop-met": (None, 5),
+        "both-met": (90, 10),
+        "drop-met-target-not": (85, 10),
+    }
+    for user_id, (target_price, min_drop_percent) in thresholds.items():
+        sqlite_db.add(
+            models.Subscription(
+                user_id=user_id,
+                link_id="p1",
+                target_price=target_price,
+                min_drop_percent=min_drop_percent,
+            )
+        )
+    sqlite_db.commit()
+
+    updated = crud.update_product_prices(
+        db=sqlite_db,
+        prices={"p1": 90.0},
+        drops={"p1": PriceDrop(event_id="e1", old_price=100.0)},
+    )
+
+    assert updated == {"p1"}
+    rows = sqlite_db.query(models.NotificationOutbox).all()
+    assert {row.user_id for row in rows} == {
+        "anything",
+        "target-met",
+        "drop-met",
+        "both-met",
+    }
+    assert {(row.event_id, row.link_id, float(row.price)) for row in rows} == {
+        ("e1", "p1", 90.0)
+    }
@@ -0,0 +1,120 @@
+import os
+
+import pytest
+
+from scraper.amazon import amazon_search
+from scraper.amazon.amazon_parser import (
+    benchmark_search_page,
+    join_price,
+    parse_product_page,
+    parse_search_page,
+)
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+BASE_URL = "https://www.amazon.com"
+
+# Microseconds of parsing per search result candidate. About 5x what a laptop takes,
+# a regression to serializing every candidate again blows through it
+SERP_BUDGET_US = 500
+
+
+def read_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), "rb") as file:
+        return file.read()
+
+
+def test_parse_product_page():
+    detail = parse_product_page(read_fixture("amazon_product.html"))
+    assert detail.title == "Sony WH-1000XM5 Wireless Noise Canceling Headphones, Black"
+    assert detail.price == 1299.99
+
+
+def test_parse_product_page_without_static_price():
+    detail = parse_product_page(read_fixture("amazon_product_no_price.html"))
+    assert detail.title == "Sony WH-1000XM4 Wireless Headphones"
+    assert detail.price is None
+
+
+def test_parse_empty_page():
+    detail = parse_product_page(b"")
+    assert detail.price is None and detail.title is None
+
+
+@pytest.mark.parametrize(
+    "whole, fraction, price",
+    [
+        ("1,299.", "99", 1299.99),
+        ("24", "00", 24.0),
+        ("Currently unavailable", "", None),
+        (None, None, None),
+    ],
+)
+def test_join_price(whole, fraction, price):
+    assert join_price(whole, fraction) == price
+
+
+def test_fetch_detail_over_http(monkeypatch):
+    # The lightweight path reads the static HTML without starting a browser
+    monkeypatch.setattr(
+        amazon_search,
+        "fetch_html",
+        lambda url, timeout: read_fixture("amazon_product.html"),
+    )
+    detail = amazon_search.amazon_fetch_detail("https://www.amazon.com/dp/B09XS7JWHH")
+    assert detail.price == 1299.99
+    assert detail.title.startswith("Sony WH-1000XM5")
+
+
+def test_parse_search_page():
+    items = parse_search_page(read_fixture("amazon_serp.html"), base_url=BASE_URL)
+
+    # The two results without a rating or an image are not products
+    assert len(items) == 8
+    first = items[0]
+    assert first.title == "Sony WH-1000XM5 Wireless Noise Canceling Headphones, Black"
+    assert first.link == (
+        "https://www.amazon.com/Sony-WH-1000XM5-Wireless-Noise/dp/B09XS7JWHH/ref=sr_1_1"
+    )
+    assert first.img_src == (
+        "https://m.media-amazon.com/images/I/B09XS7JWHH._AC_UY218_.jpg"
+    )
+    assert first.rating == 4.5
+    assert first.price == 328.0
+    assert items[3].price is None
+    assert items[4].price == 1148.0
+
+
+def test_parse_search_page_max_candidates():
+    items = parse_search_page(
+        read_fixture("amazon_serp.html"), base_url=BASE_URL, max_candidates=3
+    )
+    assert len(items) == 2
+
+
+def test_parse_page_without_results():
+    html = read_fixture("amazon_product.html")
+    assert parse_search_page(html, base_url=BASE_URL) is None
+
+
+def test_search_result_to_product():
+    candidates = parse_search_page(read_fixture("amazon_serp.html"), base_url=BASE_URL)
+    candidate = candidates[0]
+    detail = parse_product_page(read_fixture("amazon_product.html"))
+
+    product = amazon_search._to_product(
+        candidate=candidate, detail=detail, include_ls=["sony"], confirm_include=True
+    )
+
+    assert product.title == "Sony WH-1000XM5 Wireless Noise Canceling Headphones, Black"
+    assert product.price == 1299.99
+    assert product.link == candidate.link
+    assert (
+        product.link_id
+        == "f8a6caeb9a7e889fd560899cfd45a7933be108199d94e9c4f05f88c53f6e41b0"
+    )
+
+
+def test_search_page_parse_budget():
+    cost = benchmark_search_page(read_fixture("amazon_serp.html"), repeat=50)
+    assert cost < SERP_BUDGET_US, f"{cost:.1f} us per candidate"
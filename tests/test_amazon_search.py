@@ -0,0 +1,45 @@
+from selenium.common.exceptions import NoSuchElementException
+
+from lib.cache import SearchCache
+from scraper.amazon import amazon_search
+
+
+class DriverWithoutPrice:
+    """
+    A browser showing a product page without a price, that fails the test when
+    the page source or URL is read.
+    """
+
+    def find_element(self, by, value):
+        raise NoSuchElementException(value)
+
+    @property
+    def page_source(self):
+        raise AssertionError("page_source read")
+
+    @property
+    def current_url(self):
+        raise AssertionError("current_url read")
+
+
+def test_read_price_without_snapshots(monkeypatch):
+    monkeypatch.setattr(amazon_search, "get_snapshot_archive", lambda: None)
+    assert amazon_search._read_price(driver=DriverWithoutPrice()) is None
+
+
+def test_search_flight_key_matches_cache_key(monkeypatch):
+    keys = []
+    monkeypatch.setattr(
+        amazon_search.scrape_flight, "do", lambda key, fn, **kwargs: keys.append(key)
+    )
+
+    amazon_search.amazon_search(keyword="Sony  XM5", include="wireless sony")
+    amazon_search.amazon_search(keyword="sony xm5", include="Sony Wireless")
+
+    assert keys[0] == keys[1]
+    assert keys[0] == (
+        "search",
+        SearchCache.make_key(
+            vendor="amazon", kw="sony xm5", include="sony wireless", max_prod=3
+        ),
+    )
@@ -0,0 +1,111 @@
+import datetime
+
+from sqlalchemy.orm import sessionmaker
+
+from db import models
+from lib import cache, schemas
+from lib.cache import DbCacheBackend, SearchCache, TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_product(i: int) -> schemas.Product:
+    return schemas.Product(
+        title=f"Product {i}",
+        vendor=schemas.Vendor.AMAZON.value,
+        link=f"https://www.amazon.com/dp/{i}",
+        link_id=f"p{i}",
+        img_src=f"https://m.media-amazon.com/images/I/{i}.jpg",
+        price=10.0,
+    )
+
+
+def test_ttl_cache_expires_entries():
+    clock = FakeClock()
+    entries = TTLCache(ttl=10, clock=clock)
+    entries.set("a", 1)
+
+    clock.now += 9.9
+    assert entries.get("a") == 1
+    clock.now += 0.1
+    assert entries.get("a") is None
+    assert len(entries) == 0
+
+
+def test_ttl_cache_evicts_the_least_recently_used():
+    entries = TTLCache(max_size=2, clock=FakeClock())
+    entries.set("a", 1)
+    entries.set("b", 2)
+    # Reading "a" makes "b" the least recently used
+    entries.get("a")
+    entries.set("c", 3)
+
+    assert entries.get("b") is None
+    assert (entries.get("a"), entries.get("c")) == (1, 3)
+    assert len(entries) == 2
+
+
+def test_search_cache_counts_hits_and_misses():
+    search_cache = SearchCache(ttl=10)
+    key = SearchCache.make_key("amazon", "desk lamp", None, 10)
+
+    assert search_cache.get(key) is None
+    search_cache.set(key, [make_product(1)])
+    assert search_cache.get(key) == [make_product(1)]
+    assert search_cache.get(key) == [make_product(1)]
+
+    assert search_cache.stats() == {"hits": 2, "misses": 1, "size": 1}
+
+
+def test_make_key_normalizes_the_query():
+    key = SearchCache.make_key("amazon", "Desk Lamp", "led white", 10)
+
+    assert SearchCache.make_key("amazon", "  desk   LAMP ", "White LED led", 10) == key
+    assert SearchCache.make_key("amazon", "desk lamp", "led", 10) != key
+    assert SearchCache.make_key("amazon", "desk lamp", "led white", 20) != key
+    assert SearchCache.make_key("ebay", "desk lamp", "led white", 10) != key
+    assert SearchCache.make_key("amazon", "lamp", None, 10) == SearchCache.make_key(
+        "amazon", "lamp", "", 10
+    )
+
+
+def test_db_backend_round_trip_and_expiry(sqlite_db, monkeypatch):
+    monkeypatch.setattr(
+        cache, "SyncSessionLocal", sessionmaker(bind=sqlite_db.get_bind())
+    )
+    clock = FakeClock()
+    backend = DbCacheBackend(ttl=10, clock=clock)
+
+    backend.set("a", '["value"]')
+    assert backend.get("a") == '["value"]'
+    assert backend.get("b") is None
+
+    clock.now += 10
+    assert backend.get("a") is None
+
+    # Expired rows are cleaned up on the next write
+    backend.set("b", "[]")
+    sqlite_db.expire_all()
+    assert [row.key for row in sqlite_db.query(models.SearchCache).all()] == ["b"]
+    row = sqlite_db.get(models.SearchCache, "b")
+    assert row.expires_at == datetime.datetime.utcfromtimestamp(clock.now + 10)
+
+
+def test_search_cache_reads_through_the_shared_backend(sqlite_db, monkeypatch):
+    monkeypatch.setattr(
+        cache, "SyncSessionLocal", sessionmaker(bind=sqlite_db.get_bind())
+    )
+    key = SearchCache.make_key("amazon", "desk lamp", None, 10)
+    SearchCache(shared=DbCacheBackend()).set(key, [make_product(1)])
+
+    # Another worker with an empty local cache
+    other = SearchCache(shared=DbCacheBackend())
+
+    assert other.get(key) == [make_product(1)]
+    assert len(other.local) == 1
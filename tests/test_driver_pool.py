@@ -0,0 +1,124 @@
+import pytest
+from selenium.common.exceptions import WebDriverException
+
+from scraper.driver_pool import DriverPool
+
+
+class FakeDriver:
+    def __init__(self) -> None:
+        self.healthy = True
+        self.quit_called = False
+        self.urls = []
+
+    @property
+    def current_url(self) -> str:
+        if not self.healthy:
+            raise WebDriverException("session deleted")
+        return self.urls[-1] if self.urls else "about:blank"
+
+    def get(self, url: str) -> None:
+        self.urls.append(url)
+
+    def quit(self) -> None:
+        self.quit_called = True
+
+
+class FakeFactory:
+    def __init__(self) -> None:
+        self.drivers = []
+
+    def __call__(self) -> FakeDriver:
+        self.drivers.append(FakeDriver())
+        return self.drivers[-1]
+
+
+def make_pool(**kwargs) -> DriverPool:
+    return DriverPool(driver_factory=FakeFactory(), **kwargs)
+
+
+def test_checkout_times_out_when_exhausted():
+    pool = make_pool(max_size=1, checkout_timeout=0.05)
+    pooled = pool.checkout()
+
+    with pytest.raises(TimeoutError):
+        pool.checkout()
+
+    pool.checkin(pooled)
+    assert pool.checkout() is pooled
+
+
+def test_driver_is_recycled_after_max_pages():
+    pool = make_pool(max_pages=2)
+    with pool.driver() as pooled:
+        pooled.get("https://www.amazon.com/dp/1")
+    with pool.driver() as again:
+        assert again is pooled
+        again.get("https://www.amazon.com/dp/2")
+
+    with pool.driver() as fresh:
+        assert fresh is not pooled
+
+    assert pooled.driver.quit_called
+    assert pool.driver_factory.drivers[0].urls == [
+        "https://www.amazon.com/dp/1",
+        "https://www.amazon.com/dp/2",
+    ]
+    assert pool.stats()["recycled"] == 1
+
+
+def test_unhealthy_driver_is_discarded_on_checkout():
+    pool = make_pool()
+    with pool.driver() as pooled:
+        pass
+    pooled.driver.healthy = False
+
+    with pool.driver() as fresh:
+        assert fresh is not pooled
+
+    assert pooled.driver.quit_called
+    assert pool.stats()["discarded"] == 1
+
+
+def test_driver_failing_during_use_is_discarded():
+    pool = make_pool()
+    with pytest.raises(WebDriverException):
+        with pool.driver() as pooled:
+            raise WebDriverException("tab crashed")
+
+    assert pooled.driver.quit_called
+    assert pool.stats()["idle"] == 0
+    assert pool.stats()["discarded"] == 1
+
+
+def test_idle_drivers_expire():
+    pool = make_pool(max_idle_seconds=60)
+    with pool.driver() as pooled:
+        pass
+    pooled.last_used -= 61
+
+    pool.evict_idle()
+
+    assert pooled.driver.quit_called
+    assert pool.stats()["idle"] == 0
+    assert pool.stats()["recycled"] == 1
+
+
+def test_stats():
+    pool = make_pool(max_size=3)
+    first = pool.checkout()
+    second = pool.checkout()
+    pool.checkin(first)
+
+    stats = pool.stats()
+
+    assert stats["max_size"] == 3
+    assert stats["size"] == 2
+    assert stats["idle"] == 1
+    assert stats["in_use"] == 1
+    assert stats["created"] == 2
+    assert stats["checkouts"] == 2
+    assert stats["avg_wait_seconds"] >= 0
+
+    pool.checkin(second)
+    pool.close()
+    assert all(driver.quit_called for driver in pool.driver_factory.drivers)
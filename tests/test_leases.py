@@ -0,0 +1,110 @@
+import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import sessionmaker
+
+import price_monitor
+from db import crud, models
+from price_monitor import PriceMonitor
+
+
+LEASE_SECONDS = 60
+
+
+def add_products(db, n: int) -> None:
+    db.add_all(
+        models.Product(link_id=f"p{i}", vendor=0, link=f"l{i}", title=f"t{i}", price=1)
+        for i in range(n)
+    )
+    db.commit()
+
+
+def expire_leases(db, owner: str) -> None:
+    db.execute(
+        update(models.ProductLease)
+        .where(models.ProductLease.owner == owner)
+        .values(expires_at=datetime.datetime.utcnow() - datetime.timedelta(seconds=1))
+    )
+    db.commit()
+
+
+def owners(db) -> dict:
+    res = db.execute(select(models.ProductLease.link_id, models.ProductLease.owner))
+    return dict(res.all())
+
+
+def test_two_owners_split_the_products(sqlite_db):
+    add_products(sqlite_db, 4)
+
+    first = crud.claim_products(
+        db=sqlite_db, owner="a", limit=2, lease_seconds=LEASE_SECONDS
+    )
+    second = crud.claim_products(
+        db=sqlite_db, owner="b", limit=10, lease_seconds=LEASE_SECONDS
+    )
+    third = crud.claim_products(
+        db=sqlite_db, owner="c", limit=10, lease_seconds=LEASE_SECONDS
+    )
+
+    assert len(first) == 2
+    assert len(second) == 2
+    assert third == []
+    assert set(first).isdisjoint(second)
+    assert set(first) | set(second) == {"p0", "p1", "p2", "p3"}
+
+
+def test_renew_drops_expired_and_deleted_leases(sqlite_db):
+    add_products(sqlite_db, 3)
+    crud.claim_products(db=sqlite_db, owner="a", limit=3, lease_seconds=LEASE_SECONDS)
+    expire_leases(sqlite_db, "a")
+    sqlite_db.execute(
+        update(models.ProductLease)
+        .where(models.ProductLease.link_id == "p0")
+        .values(expires_at=datetime.datetime.utcnow() + datetime.timedelta(seconds=5))
+    )
+    sqlite_db.delete(sqlite_db.get(models.Product, "p2"))
+    sqlite_db.commit()
+
+    held = crud.renew_leases(db=sqlite_db, owner="a", lease_seconds=LEASE_SECONDS)
+
+    assert held == {"p0"}
+    assert "p2" not in owners(sqlite_db)
+    assert sqlite_db.get(models.MonitorWorker, "a") is not None
+
+
+def test_second_owner_takes_over_after_expiry(sqlite_db):
+    add_products(sqlite_db, 2)
+    crud.claim_products(db=sqlite_db, owner="a", limit=2, lease_seconds=LEASE_SECONDS)
+
+    assert crud.claim_products(
+        db=sqlite_db, owner="b", limit=2, lease_seconds=LEASE_SECONDS
+    ) == []
+
+    expire_leases(sqlite_db, "a")
+    taken = crud.claim_products(
+        db=sqlite_db, owner="b", limit=2, lease_seconds=LEASE_SECONDS
+    )
+
+    assert sorted(taken) == ["p0", "p1"]
+    assert owners(sqlite_db) == {"p0": "b", "p1": "b"}
+    assert crud.renew_leases(db=sqlite_db, owner="a", lease_seconds=LEASE_SECONDS) == set()
+
+
+def test_rebalance_releases_the_surplus_when_a_worker_joins(sqlite_db, monkeypatch):
+    monkeypatch.setattr(
+        price_monitor, "SyncSessionLocal", sessionmaker(bind=sqlite_db.get_bind())
+    )
+    add_products(sqlite_db, 4)
+    first = PriceMonitor(worker_id="a")
+    second = PriceMonitor(worker_id="b")
+
+    assert len(first.rebalance_shard()) == 4
+
+    # The second worker has nothing to claim until the first one gives some back
+    assert second.rebalance_shard() == set()
+    assert len(first.rebalance_shard()) == 2
+    assert len(second.rebalance_shard()) == 2
+    assert first.owned.isdisjoint(second.owned)
+
+    sqlite_db.expire_all()
+    assert sorted(owners(sqlite_db).values()) == ["a", "a", "b", "b"]
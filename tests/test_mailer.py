@@ -0,0 +1,89 @@
+import socketserver
+import threading
+from email.message import EmailMessage
+
+import pytest
+
+from lib.mailer import SmtpPool
+
+
+class StubSmtpHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough of an SMTP server that requires AUTH before accepting mail.
+    """
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self) -> None:
+        authenticated = False
+        self.reply("220 stub ready")
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            verb = line.split(" ")[0].upper()
+            self.server.commands.append(verb)
+            if verb == "EHLO":
+                self.reply("250-stub")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif verb == "AUTH":
+                authenticated = True
+                self.reply("235 authenticated")
+            elif verb == "MAIL":
+                self.reply("250 ok" if authenticated else "530 authentication required")
+            elif verb == "RCPT":
+                self.reply("250 ok")
+            elif verb == "DATA":
+                self.reply("354 go ahead")
+                while self.rfile.readline().strip() != b".":
+                    pass
+                self.reply("250 queued")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), StubSmtpHandler)
+    server.daemon_threads = True
+    server.commands = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_message() -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = "sender@example.com"
+    msg["To"] = "user@example.com"
+    msg["Subject"] = "Price drop"
+    msg.set_content("It is cheaper now")
+    return msg
+
+
+def test_send_logs_in(smtp_server):
+    pool = SmtpPool(
+        host="127.0.0.1",
+        port=smtp_server.server_address[1],
+        user="sender@example.com",
+        password="secret",
+        starttls=False,
+        timeout=5,
+    )
+    try:
+        assert pool.send(make_message())
+        assert pool.send(make_message())
+    finally:
+        pool.close()
+
+    assert smtp_server.commands[:3] == ["EHLO", "AUTH", "MAIL"]
+    # The second message reuses the logged in connection
+    assert smtp_server.commands.count("AUTH") == 1
+    assert pool.stats()["sent"] == 2
+    assert pool.stats()["connections_opened"] == 1
@@ -0,0 +1,98 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from db import migrations
+
+
+# The tables as they were before versioned migrations
+LEGACY_SCHEMA = [
+    "CREATE TABLE user (id VARCHAR(64) PRIMARY KEY, email VARCHAR(64), "
+    "first_name VARCHAR(30), last_name VARCHAR(30))",
+    "CREATE TABLE product (title VARCHAR(1024), vendor SMALLINT, link VARCHAR(2048), "
+    "link_id VARCHAR(64) PRIMARY KEY, img_src VARCHAR(2048), price DECIMAL(10,2))",
+    "CREATE TABLE subscription (user_id VARCHAR(64), link_id VARCHAR(64), "
+    "PRIMARY KEY (user_id, link_id))",
+]
+
+
+@pytest.fixture
+def conn():
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        yield conn
+    engine.dispose()
+
+
+def create_legacy_schema(conn) -> None:
+    for statement in LEGACY_SCHEMA:
+        conn.execute(text(statement))
+    conn.execute(text("INSERT INTO product (link_id, price) VALUES ('p1', 5)"))
+    conn.execute(text("INSERT INTO subscription VALUES ('u1', 'p1')"))
+    conn.commit()
+
+
+def applied_versions(conn) -> list:
+    return conn.execute(
+        text("SELECT version FROM schema_version ORDER BY version")
+    ).scalars().all()
+
+
+def test_migrations_are_numbered():
+    versions = [m.VERSION for m in migrations.get_migrations()]
+    assert versions == list(range(1, len(versions) + 1))
+
+
+def test_upgrade_fresh_database(conn):
+    latest = migrations.get_migrations()[-1].VERSION
+
+    assert migrations.upgrade(conn) == latest
+    assert applied_versions(conn) == list(range(1, latest + 1))
+    tables = inspect(conn).get_table_names()
+    assert {"user", "product", "subscription", "notification_outbox"} <= set(tables)
+
+    # Applied migrations are not run again
+    assert migrations.upgrade(conn) == latest
+    assert applied_versions(conn) == list(range(1, latest + 1))
+
+
+def test_upgrade_in_steps(conn):
+    assert migrations.upgrade(conn, target=2) == 2
+    assert applied_versions(conn) == [1, 2]
+    latest = migrations.upgrade(conn)
+    assert applied_versions(conn) == list(range(1, latest + 1))
+
+
+def test_upgrade_legacy_database(conn):
+    create_legacy_schema(conn)
+
+    migrations.upgrade(conn)
+
+    inspector = inspect(conn)
+    user_columns = {c["name"] for c in inspector.get_columns("user")}
+    subscription_columns = {c["name"] for c in inspector.get_columns("subscription")}
+    assert "alert_mode" in user_columns
+    assert {"target_price", "min_drop_percent"} <= subscription_columns
+    indexes = {i["name"] for i in inspector.get_indexes("subscription")}
+    assert "ix_subscription_link_id" in indexes
+    # Existing rows are kept
+    assert conn.execute(text("SELECT user_id, link_id FROM subscription")).all() == [
+        ("u1", "p1")
+    ]
+
+
+def test_upgrade_stops_at_orphaned_subscriptions(conn):
+    create_legacy_schema(conn)
+    conn.execute(text("INSERT INTO subscription VALUES ('u1', 'gone')"))
+    conn.commit()
+
+    with pytest.raises(RuntimeError, match="1 subscriptions .* gone"):
+        migrations.upgrade(conn)
+    conn.rollback()
+
+    # Nothing is deleted, the migrations before stay applied
+    assert conn.execute(text("SELECT COUNT(*) FROM subscription")).scalar() == 2
+    assert applied_versions(conn) == [1, 2, 3, 4]
+
+    conn.execute(text("INSERT INTO product (link_id, price) VALUES ('gone', 1)"))
+    conn.commit()
+    assert migrations.upgrade(conn) == migrations.get_migrations()[-1].VERSION
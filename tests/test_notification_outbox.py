@@ -0,0 +1,149 @@
+import datetime
+
+from db import crud, models
+from lib import schemas
+from notification_dispatcher import NotificationDispatcher
+
+
+DIGEST_WINDOW = 3600
+
+
+def add_notification(
+    db,
+    event_id: str,
+    attempts: int = 0,
+    user_id: str = "u1",
+    link_id: str = "p1",
+    age: float = 0,
+) -> None:
+    now = datetime.datetime.utcnow()
+    db.add(
+        models.NotificationOutbox(
+            event_id=event_id,
+            user_id=user_id,
+            link_id=link_id,
+            price=10,
+            status="pending",
+            attempts=attempts,
+            next_attempt_at=now - datetime.timedelta(seconds=1),
+            created_at=now - datetime.timedelta(seconds=age),
+        )
+    )
+    db.commit()
+
+
+def add_user(db, user_id: str, alert_mode: str) -> None:
+    db.add(
+        models.User(id=user_id, email=f"{user_id}@example.com", alert_mode=alert_mode)
+    )
+    db.commit()
+
+
+def add_product(db, link_id: str = "p1") -> None:
+    db.add(
+        models.Product(
+            link_id=link_id,
+            vendor=schemas.Vendor.AMAZON.value,
+            link=f"https://www.amazon.com/dp/{link_id}",
+            title=f"Product {link_id}",
+        )
+    )
+    db.commit()
+
+
+def claim(db) -> list:
+    return crud.claim_notifications(
+        db=db,
+        limit=10,
+        lease_seconds=300,
+        digest_window=DIGEST_WINDOW,
+        max_attempts=3,
+    )
+
+
+def test_claim_counts_attempts(sqlite_db):
+    add_notification(sqlite_db, event_id="e1", attempts=0)
+    rows = claim(sqlite_db)
+    assert [(row.event_id, row.attempts) for row in rows] == [("e1", 1)]
+    # Leased, not due again until the lease runs out
+    assert claim(sqlite_db) == []
+
+
+def test_claim_dead_letters_rows_out_of_attempts(sqlite_db):
+    add_notification(sqlite_db, event_id="e1", attempts=3)
+    add_notification(sqlite_db, event_id="e2", attempts=2)
+
+    rows = claim(sqlite_db)
+
+    assert [row.event_id for row in rows] == ["e2"]
+    dead = sqlite_db.query(models.NotificationOutbox).filter_by(event_id="e1").one()
+    assert dead.status == "dead"
+    assert dead.last_error
+
+
+def test_claim_holds_digest_rows_back_until_the_window_passed(sqlite_db):
+    add_user(sqlite_db, "digest", alert_mode="digest")
+    add_user(sqlite_db, "instant", alert_mode="instant")
+    add_notification(sqlite_db, event_id="e1", user_id="digest")
+    add_notification(sqlite_db, event_id="e2", user_id="instant")
+
+    assert [row.event_id for row in claim(sqlite_db)] == ["e2"]
+
+
+def test_claim_takes_every_due_row_of_a_digest_together(sqlite_db):
+    add_user(sqlite_db, "digest", alert_mode="digest")
+    add_notification(
+        sqlite_db, event_id="e1", user_id="digest", attempts=1, age=DIGEST_WINDOW
+    )
+    # Newer than the window, but goes out with the oldest row
+    add_notification(sqlite_db, event_id="e2", user_id="digest", attempts=0)
+
+    rows = claim(sqlite_db)
+
+    assert [(row.event_id, row.attempts) for row in rows] == [("e1", 2), ("e2", 1)]
+
+
+def test_claim_treats_a_missing_alert_mode_as_instant(sqlite_db):
+    # The subscriber is gone, the join leaves alert_mode NULL
+    add_notification(sqlite_db, event_id="e1", user_id="deleted")
+
+    rows = claim(sqlite_db)
+
+    assert [(row.event_id, row.alert_mode) for row in rows] == [("e1", None)]
+
+
+def test_group_builds_one_message_per_digest_user(sqlite_db):
+    add_product(sqlite_db, "p1")
+    add_product(sqlite_db, "p2")
+    add_user(sqlite_db, "a", alert_mode="digest")
+    add_user(sqlite_db, "b", alert_mode="digest")
+    add_user(sqlite_db, "c", alert_mode="instant")
+    for event_id, user_id, link_id, attempts in [
+        ("e1", "a", "p1", 0),
+        ("e2", "a", "p2", 2),
+        ("e3", "b", "p1", 0),
+        ("e4", "c", "p1", 0),
+        ("e5", "c", "p2", 0),
+    ]:
+        add_notification(
+            sqlite_db,
+            event_id=event_id,
+            user_id=user_id,
+            link_id=link_id,
+            attempts=attempts,
+            age=DIGEST_WINDOW,
+        )
+
+    groups = NotificationDispatcher().group(claim(sqlite_db))
+
+    assert sorted([row.event_id for row in group] for group in groups) == [
+        ["e1", "e2"],
+        ["e3"],
+        ["e4"],
+        ["e5"],
+    ]
+    digest = next(group for group in groups if len(group) == 2)
+    assert [row.attempts for row in digest] == [1, 3]
+    msg = NotificationDispatcher().build_message(digest)
+    assert msg["To"] == "a@example.com"
+    assert "2 of your products" in msg["Subject"]
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from scraper.amazon.amazon_parser import parse_product_page
+from scraper.parse_pool import ParsePool
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+@pytest.fixture
+def product_html() -> bytes:
+    with open(os.path.join(FIXTURES, "amazon_product.html"), "rb") as file:
+        return file.read()
+
+
+@pytest.mark.parametrize("processes", [None, 2])
+def test_parse_pool(processes, product_html):
+    pool = ParsePool(processes=processes)
+    try:
+        expected = parse_product_page(product_html)
+        assert pool.parse(parse_product_page, product_html) == expected
+        assert pool.map(parse_product_page, [product_html] * 5) == [expected] * 5
+    finally:
+        pool.close()
+
+
+def test_parse_pool_workers_are_spawned(product_html):
+    pool = ParsePool(processes=1)
+    try:
+        pool.parse(parse_product_page, product_html)
+        assert pool._executor._mp_context.get_start_method() == "spawn"
+    finally:
+        pool.close()
+
+
+def test_parse_pool_restarts_after_close(product_html):
+    pool = ParsePool(processes=1)
+    try:
+        pool.parse(parse_product_page, product_html)
+        pool.close()
+        assert pool.parse(parse_product_page, product_html).price == 1299.99
+    finally:
+        pool.close()
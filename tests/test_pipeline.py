@@ -0,0 +1,159 @@
+import asyncio
+
+from lib.pipeline import Pipeline, Stage
+
+
+def collect(results: list) -> Stage:
+    async def handler(item):
+        results.append(item)
+
+    return Stage(name="collect", handler=handler)
+
+
+def test_stages_run_in_order():
+    calls = []
+    results = []
+
+    async def add_one(item):
+        calls.append(("add_one", item))
+        return item + 1
+
+    async def double(item):
+        calls.append(("double", item))
+        return item * 2
+
+    stats = asyncio.run(
+        Pipeline(
+            [
+                Stage(name="add_one", handler=add_one),
+                Stage(name="double", handler=double),
+                collect(results),
+            ]
+        ).run([10, 20, 30])
+    )
+
+    assert results == [22, 42, 62]
+    # Every item went through add_one before double
+    for item in [10, 20, 30]:
+        assert calls.index(("add_one", item)) < calls.index(("double", item + 1))
+    assert stats["add_one"].forwarded == 3
+    assert stats["collect"].processed == 3
+
+
+def test_slow_stage_backpressures_the_stages_in_front():
+    produced = []
+    gate = asyncio.Event()
+
+    async def produce(item):
+        produced.append(item)
+        return item
+
+    async def wait(item):
+        await gate.wait()
+
+    async def run():
+        pipeline = Pipeline(
+            [
+                Stage(name="produce", handler=produce, queue_size=1),
+                Stage(name="wait", handler=wait, queue_size=1),
+            ]
+        )
+        task = asyncio.create_task(pipeline.run(range(100)))
+        await asyncio.sleep(0.05)
+        # One item in each handler or queue between the two stages
+        blocked_at = len(produced)
+        gate.set()
+        stats = await task
+        return blocked_at, stats
+
+    blocked_at, stats = asyncio.run(run())
+
+    assert blocked_at == 3
+    assert stats["wait"].processed == 100
+
+
+def test_batches_flush_on_size_and_shutdown():
+    batches = []
+
+    async def record(batch):
+        batches.append(batch)
+        return batch
+
+    asyncio.run(
+        Pipeline(
+            [Stage(name="record", handler=record, batch_size=3, batch_timeout=60)]
+        ).run(range(7))
+    )
+
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_batches_flush_on_timeout():
+    batches = []
+
+    async def slow_after_two(item):
+        if item == 2:
+            await asyncio.sleep(0.3)
+        return item
+
+    async def record(batch):
+        batches.append(batch)
+        return batch
+
+    asyncio.run(
+        Pipeline(
+            [
+                Stage(name="slow_after_two", handler=slow_after_two),
+                Stage(name="record", handler=record, batch_size=10, batch_timeout=0.1),
+            ]
+        ).run(range(4))
+    )
+
+    assert batches == [[0, 1], [2, 3]]
+
+
+def test_stage_concurrency():
+    in_flight = {"fast": 0, "single": 0}
+    peak = {"fast": 0, "single": 0}
+
+    def track(name):
+        async def handler(item):
+            in_flight[name] += 1
+            peak[name] = max(peak[name], in_flight[name])
+            await asyncio.sleep(0.01)
+            in_flight[name] -= 1
+            return item
+
+        return handler
+
+    stats = asyncio.run(
+        Pipeline(
+            [
+                Stage(name="fast", handler=track("fast"), concurrency=3),
+                Stage(name="single", handler=track("single")),
+            ]
+        ).run(range(12))
+    )
+
+    assert peak == {"fast": 3, "single": 1}
+    assert stats["single"].processed == 12
+
+
+def test_failing_item_is_dropped_and_the_sweep_completes():
+    results = []
+
+    async def fail_on_two(item):
+        if item == 2:
+            raise ValueError("bad item")
+        return item
+
+    stats = asyncio.run(
+        Pipeline(
+            [Stage(name="fail_on_two", handler=fail_on_two), collect(results)]
+        ).run(range(5))
+    )
+
+    assert results == [0, 1, 3, 4]
+    assert stats["fail_on_two"].errors == 1
+    assert stats["fail_on_two"].processed == 5
+    assert stats["fail_on_two"].forwarded == 4
@@ -0,0 +1,70 @@
+import asyncio
+import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from config import get_settings
+from db import crud
+from services.subscription_service import SubscriptionService
+
+
+UTC = datetime.timezone.utc
+
+
+def test_to_naive_utc():
+    cest = datetime.timezone(datetime.timedelta(hours=2))
+    aware = datetime.datetime(2026, 10, 1, 2, 30, tzinfo=cest)
+    assert crud.to_naive_utc(aware) == datetime.datetime(2026, 10, 1, 0, 30)
+    naive = datetime.datetime(2026, 10, 1, 0, 30)
+    assert crud.to_naive_utc(naive) == naive
+
+
+def test_period_start_of_aware_datetime():
+    ts = datetime.datetime(2026, 10, 1, 13, 45, tzinfo=UTC)
+    assert crud._period_start(ts, crud.ROLLUP_SECONDS["hour"]) == datetime.datetime(
+        2026, 10, 1, 13
+    )
+
+
+def test_history_with_aware_bounds(sqlite_session):
+    async def run():
+        async with sqlite_session() as db:
+            await db.run_sync(
+                lambda session: crud.add_price_observations(
+                    session,
+                    [
+                        ("p1", datetime.datetime(2026, 10, 1, 10, 5), 20.0),
+                        ("p1", datetime.datetime(2026, 10, 1, 10, 50), 18.0),
+                        ("p1", datetime.datetime(2026, 10, 1, 12, 0), 19.0),
+                    ],
+                )
+            )
+            service = SubscriptionService(settings=get_settings(), async_db=db)
+            return await service.get_price_history(
+                link_id="p1",
+                resolution="hour",
+                start=datetime.datetime(2026, 10, 1, tzinfo=UTC),
+                end=datetime.datetime(2026, 10, 2, tzinfo=UTC),
+            )
+
+    history = asyncio.run(run())
+    assert [(p.min_price, p.max_price, p.last_price) for p in history.points] == [
+        (18.0, 20.0, 18.0),
+        (19.0, 19.0, 19.0),
+    ]
+
+
+def test_history_rejects_start_after_end(sqlite_session):
+    async def run():
+        async with sqlite_session() as db:
+            service = SubscriptionService(settings=get_settings(), async_db=db)
+            await service.get_price_history(
+                link_id="p1",
+                start=datetime.datetime(2026, 10, 2, tzinfo=UTC),
+                end=datetime.datetime(2026, 10, 1),
+            )
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(run())
+    assert exc_info.value.status_code == 400
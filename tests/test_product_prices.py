@@ -0,0 +1,51 @@
+from db import crud, models
+from lib.alerts import PriceDrop
+
+
+def add_products(db, link_ids) -> None:
+    for link_id in link_ids:
+        db.add(models.Product(link_id=link_id, price=100))
+        db.add(models.Subscription(user_id="u1", link_id=link_id))
+    db.commit()
+
+
+def prices_of(db) -> dict:
+    db.expire_all()
+    return {row.link_id: float(row.price) for row in db.query(models.Product).all()}
+
+
+def test_unknown_link_ids_are_skipped(sqlite_db):
+    add_products(sqlite_db, ["p1"])
+
+    updated = crud.update_product_prices(
+        db=sqlite_db, prices={"p1": 90.0, "unknown": 80.0}
+    )
+
+    assert updated == {"p1"}
+    assert prices_of(sqlite_db) == {"p1": 90.0}
+
+
+def test_failing_chunk_leaves_the_other_chunks(sqlite_db, monkeypatch):
+    add_products(sqlite_db, ["p1", "p2", "p3", "p4"])
+    enqueue = crud.enqueue_notifications
+
+    def enqueue_failing_on_p3(db, drops, prices):
+        enqueue(db=db, drops=drops, prices=prices)
+        if "p3" in drops:
+            raise RuntimeError("lost connection")
+
+    monkeypatch.setattr(crud, "enqueue_notifications", enqueue_failing_on_p3)
+    link_ids = ["p1", "p2", "unknown", "p3", "p4"]
+
+    updated = crud.update_product_prices(
+        db=sqlite_db,
+        prices={link_id: 90.0 for link_id in link_ids},
+        chunk_size=3,
+        drops={link_id: PriceDrop(f"e-{link_id}", 100.0) for link_id in link_ids},
+    )
+
+    # The second chunk's prices and notifications are rolled back together
+    assert updated == {"p1", "p2"}
+    assert prices_of(sqlite_db) == {"p1": 90.0, "p2": 90.0, "p3": 100.0, "p4": 100.0}
+    rows = sqlite_db.query(models.NotificationOutbox).all()
+    assert sorted(row.link_id for row in rows) == ["p1", "p2"]
@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from lib.scheduler import CheckScheduler, ProductState, TokenBucket
+
+
+def make_scheduler(**kwargs) -> CheckScheduler:
+    return CheckScheduler(
+        base_interval=3600, min_interval=900, max_interval=86400, **kwargs
+    )
+
+
+@pytest.mark.parametrize("price", [None, -1.0])
+def test_product_without_price(price):
+    state = ProductState(link_id="p1", vendor=1, subscribers=1, price=price)
+    assert state.price is None
+
+
+@pytest.mark.parametrize(
+    "old_price, new_price", [(None, 20.0), (0, 20.0), (20.0, -1.0)]
+)
+def test_record_unknown_prices_keeps_statistics(old_price, new_price):
+    scheduler = make_scheduler()
+    scheduler.upsert(link_id="p1", vendor=1, subscribers=1, price=old_price)
+    scheduler.pop_due(limit=1)
+
+    scheduler.record("p1", new_price=new_price)
+
+    state = scheduler.states["p1"]
+    assert state.volatility == 0.0
+    assert state.last_change is None
+    assert state.price == (new_price if new_price >= 0 else old_price)
+    interval = scheduler.interval(state, now=0)
+    assert scheduler.min_interval <= interval <= scheduler.max_interval
+
+
+def test_record_price_change():
+    scheduler = make_scheduler()
+    scheduler.upsert(link_id="p1", vendor=1, subscribers=1, price=20.0)
+    scheduler.pop_due(limit=1)
+
+    scheduler.record("p1", new_price=10.0)
+
+    state = scheduler.states["p1"]
+    assert state.price == 10.0
+    assert state.volatility == pytest.approx(CheckScheduler.VOLATILITY_DECAY * 0.5)
+    assert state.last_change is not None
+
+
+def test_token_bucket_refill():
+    bucket = TokenBucket(rate_per_hour=3600, capacity=2)
+    now = bucket.updated
+
+    assert bucket.take(now)
+    assert bucket.take(now)
+    assert not bucket.take(now)
+    assert bucket.wait_time(now) == pytest.approx(1.0)
+    # One token per second at 3600 per hour
+    assert bucket.take(now + 1)
+    assert not bucket.take(now + 1)
+    # Never more than the capacity, however long it was idle
+    assert bucket.take(now + 3600)
+    assert bucket.take(now + 3600)
+    assert not bucket.take(now + 3600)
+
+
+def test_token_bucket_share():
+    bucket = TokenBucket(rate_per_hour=1200)
+    bucket.set_rate(600)
+    assert bucket.rate == pytest.approx(600 / 3600)
+    assert bucket.capacity == 50
+
+
+def test_pop_due_in_order_of_next_check():
+    scheduler = make_scheduler()
+    for link_id, subscribers in [("p1", 0), ("p2", 100), ("p3", 1)]:
+        scheduler.upsert(link_id=link_id, vendor=1, subscribers=subscribers, price=10)
+    now = time.time() + 1
+
+    # New products are due immediately, in the order they were added
+    assert scheduler.pop_due(limit=2, now=now) == ["p1", "p2"]
+    assert scheduler.pop_due(limit=2, now=now) == ["p3"]
+    # In flight until recorded
+    assert scheduler.pop_due(limit=10, now=now) == []
+
+    for link_id in ["p1", "p2", "p3"]:
+        scheduler.record(link_id, new_price=10)
+    # More subscribers, sooner. Nobody watching, as rarely as allowed
+    assert scheduler.next_check_of("p2") < scheduler.next_check_of("p3")
+    assert scheduler.next_check_of("p3") < scheduler.next_check_of("p1")
+    assert scheduler.pop_due(limit=10, now=now) == []
+    assert scheduler.pop_due(limit=10, now=now + 86400) == ["p2", "p3", "p1"]
+
+
+def test_pop_due_respects_vendor_budget():
+    # 12 checks per hour allow a burst of one
+    scheduler = make_scheduler(vendor_budgets={1: 12})
+    scheduler.upsert(link_id="p1", vendor=1, subscribers=1, price=10)
+    scheduler.upsert(link_id="p2", vendor=1, subscribers=1, price=10)
+    scheduler.upsert(link_id="p3", vendor=2, subscribers=1, price=10)
+    now = time.time() + 1
+
+    assert scheduler.pop_due(limit=10, now=now) == ["p1", "p3"]
+    # Deferred until the vendor has a token again, 300 seconds at 12 per hour
+    assert scheduler.next_check_of("p2") == pytest.approx(now + 300, abs=1)
+    assert scheduler.pop_due(limit=10, now=now + 301) == ["p2"]
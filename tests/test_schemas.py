@@ -0,0 +1,26 @@
+import pytest
+from pydantic import ValidationError
+
+from lib import schemas
+
+
+@pytest.mark.parametrize(
+    "threshold",
+    [
+        {"target_price": 0, "min_drop_percent": 0},
+        {"target_price": 99.5, "min_drop_percent": 100},
+        {"target_price": None, "min_drop_percent": None},
+        {},
+    ],
+)
+def test_alert_threshold(threshold):
+    schemas.AlertThresholdReq(**threshold)
+
+
+@pytest.mark.parametrize(
+    "threshold",
+    [{"target_price": -1}, {"min_drop_percent": -5}, {"min_drop_percent": 101}],
+)
+def test_alert_threshold_out_of_range(threshold):
+    with pytest.raises(ValidationError):
+        schemas.AlertThresholdReq(**threshold)
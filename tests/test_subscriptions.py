@@ -0,0 +1,138 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+from config import get_settings
+from db import crud, models
+from lib import schemas
+from services.subscription_service import SubscriptionService
+
+
+def make_product(i: int, price: float = 10.0) -> schemas.Product:
+    return schemas.Product(
+        title=f"Product {i}",
+        vendor=schemas.Vendor.AMAZON.value,
+        link=f"https://www.amazon.com/dp/{i}",
+        link_id=f"p{i}",
+        img_src=f"https://m.media-amazon.com/images/I/{i}.jpg",
+        price=price,
+    )
+
+
+async def count(db, model) -> int:
+    return (await db.execute(select(func.count()).select_from(model))).scalar()
+
+
+def test_subscribe_products_counts_new_subscriptions(sqlite_session):
+    async def run():
+        async with sqlite_session() as db:
+            first = await crud.subscribe_products(
+                db=db, user_id="u1", products=[make_product(1), make_product(2)]
+            )
+            again = await crud.subscribe_products(
+                db=db, user_id="u1", products=[make_product(2), make_product(3)]
+            )
+            other_user = await crud.subscribe_products(
+                db=db, user_id="u2", products=[make_product(1)]
+            )
+            product = await db.get(models.Product, "p1")
+            return (
+                first,
+                again,
+                other_user,
+                await count(db, models.Product),
+                await count(db, models.Subscription),
+                product.price,
+            )
+
+    first, again, other_user, products, subscriptions, price = asyncio.run(run())
+    assert (first, again, other_user) == (2, 1, 1)
+    assert (products, subscriptions) == (3, 4)
+    # Existing products are left as they are
+    assert price == 10
+
+
+def test_subscribe_products_skips_duplicates_in_the_list(sqlite_session):
+    async def run():
+        async with sqlite_session() as db:
+            products = [make_product(1), make_product(1, price=20), make_product(2)]
+            return await crud.subscribe_products(
+                db=db, user_id="u1", products=products
+            )
+
+    assert asyncio.run(run()) == 2
+
+
+def test_subscribe_and_subscribe_many(sqlite_session):
+    async def run():
+        async with sqlite_session() as db:
+            service = SubscriptionService(settings=get_settings(), async_db=db)
+            too_many = service.subscribe_max_products + 1
+            return [
+                await service.subscribe(user_id="u1", product=make_product(1)),
+                await service.subscribe(user_id="u1", product=make_product(1)),
+                await service.subscribe_many(
+                    user_id="u1", products=[make_product(i) for i in range(200)]
+                ),
+                await service.subscribe_many(
+                    user_id="u1",
+                    products=[make_product(i) for i in range(too_many)],
+                ),
+            ]
+
+    subscribed, again, many, too_many = asyncio.run(run())
+    assert subscribed.status == "success"
+    assert again.status == "failure"
+    assert many.status == "success" and "199 new products" in many.detail
+    assert too_many.status == "failure"
+
+
+def test_get_products_pages_through_every_subscription(sqlite_session):
+    async def run():
+        async with sqlite_session() as db:
+            await crud.subscribe_products(
+                db=db, user_id="u1", products=[make_product(i) for i in range(7)]
+            )
+            # Another user's products sort between and around the first user's
+            await crud.subscribe_products(
+                db=db,
+                user_id="u2",
+                products=[make_product(i) for i in [3, 10, 50, 70]],
+            )
+            service = SubscriptionService(settings=get_settings(), async_db=db)
+            pages = []
+            cursor = None
+            while True:
+                page = await service.get_products(user_id="u1", limit=3, cursor=cursor)
+                pages.append(page)
+                cursor = page.next_cursor
+                if cursor is None:
+                    return pages
+
+    pages = asyncio.run(run())
+
+    link_ids = [p.link_id for page in pages for p in page.products]
+    assert [len(page.products) for page in pages] == [3, 3, 1]
+    assert sorted(link_ids) == [f"p{i}" for i in range(7)]
+    assert len(set(link_ids)) == len(link_ids)
+    assert pages[-1].next_cursor is None
+
+
+def test_get_products_last_full_page_has_no_cursor(sqlite_session):
+    async def run():
+        async with sqlite_session() as db:
+            await crud.subscribe_products(
+                db=db, user_id="u1", products=[make_product(i) for i in range(6)]
+            )
+            service = SubscriptionService(settings=get_settings(), async_db=db)
+            first = await service.get_products(user_id="u1", limit=3)
+            second = await service.get_products(
+                user_id="u1", limit=3, cursor=first.next_cursor
+            )
+            return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first.next_cursor == "p2"
+    assert [p.link_id for p in second.products] == ["p3", "p4", "p5"]
+    assert second.next_cursor is None